@@ -0,0 +1,181 @@
+import joblib
+import numpy as np
+import pandas as pd
+
+from graficos import quantile_stats
+
+
+# Pipeline exportado pelo notebook (seção 18): StandardScaler + Isolation Forest treinados juntos
+PIPELINE_PATH = 'iso_forest_pipeline.pkl'
+
+# Colunas que identificam a instalação e que são usadas nos gráficos da dashboard
+ID_COLUMNS = ['clientCode', 'clientCode_encoded', 'clientIndex']
+PLOT_COLUMNS = ['delta_time', 'consumo_horarizado']
+ID_DTYPES = {'clientCode': 'object', 'clientCode_encoded': 'int32', 'clientIndex': 'int32'}
+
+CHUNK_SIZE = 200_000
+NORMAL_SAMPLE_SIZE = 50_000
+ANOMALY_SAMPLE_SIZE = 50_000
+
+
+def load_inference_pipeline(path=PIPELINE_PATH):
+    """
+    Carrega o pipeline de inferência (scaler + Isolation Forest) salvo pelo notebook.
+    O pipeline guarda em feature_names_in_ as colunas com que foi treinado.
+    """
+    pipeline = joblib.load(path)
+    if not hasattr(pipeline, 'feature_names_in_'):
+        raise ValueError("O pipeline carregado não possui a lista de colunas de treino (feature_names_in_).")
+    return pipeline
+
+
+def expected_columns(pipeline):
+    return list(pipeline.feature_names_in_)
+
+
+def validate_columns(df, colunas):
+    faltantes = [col for col in colunas if col not in df.columns]
+    if faltantes:
+        raise ValueError(f"As seguintes colunas necessárias não estão no arquivo: {', '.join(faltantes)}")
+    return True
+
+
+def predict_anomalies(pipeline, df):
+    """
+    Aplica o scaler de treino e o Isolation Forest nas colunas esperadas pelo modelo.
+    Retorna 0 para normal e 1 para anomalia, alinhado ao índice do DataFrame.
+    """
+    colunas = expected_columns(pipeline)
+    validate_columns(df, colunas)
+    labels = pipeline.predict(df[colunas])
+    return pd.Series(labels, index=df.index).map({1: 0, -1: 1})
+
+
+def _read_header(arquivo, nrows=0):
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    df = pd.read_csv(arquivo, nrows=nrows)
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    return df
+
+
+def plan_dtypes(arquivo, colunas, nrows=1000):
+    """
+    Define os dtypes de leitura a partir das primeiras linhas do arquivo, para que todos os pedaços
+    sejam lidos com os mesmos tipos: ids em inteiros/objeto, booleanos como bool e números em float32.
+    """
+    amostra = _read_header(arquivo, nrows=nrows)[colunas]
+    dtypes = {}
+    for col in colunas:
+        if col in ID_DTYPES:
+            dtypes[col] = ID_DTYPES[col]
+        elif amostra[col].dtype == bool:
+            dtypes[col] = 'bool'
+        else:
+            dtypes[col] = 'float32'
+    return dtypes
+
+
+def _reservoir_update(reservatorio, chaves_reservatorio, novos, rng, tamanho):
+    """
+    Amostragem por reservatório: cada linha recebe uma chave aleatória e ficam as tamanho menores chaves,
+    o que mantém uma amostra uniforme de todas as linhas já vistas com tamanho fixo.
+    """
+    chaves = np.concatenate([chaves_reservatorio, rng.random(len(novos))])
+    candidatos = novos if reservatorio is None else pd.concat([reservatorio, novos], ignore_index=True)
+    manter = np.argsort(chaves)[:tamanho]
+    return candidatos.iloc[manter].reset_index(drop=True), chaves[manter]
+
+
+def score_csv_in_chunks(arquivo, pipeline, chunksize=CHUNK_SIZE, tamanho_amostra=NORMAL_SAMPLE_SIZE,
+                        tamanho_amostra_anomalias=ANOMALY_SAMPLE_SIZE, random_state=42):
+    """
+    Lê o CSV em pedaços de tamanho fixo, apenas com as colunas necessárias, e classifica cada pedaço.
+    Contagens, tabela de instalações anômalas, pontos para os gráficos e matriz de correlação são
+    acumuladas a cada pedaço, de forma que a memória usada depende do tamanho do pedaço e não do arquivo.
+    Para os gráficos são guardadas amostras uniformes (reservatório) de tamanho fixo das normais e das anomalias.
+    """
+    colunas_modelo = expected_columns(pipeline)
+    validate_columns(_read_header(arquivo), ID_COLUMNS + PLOT_COLUMNS + colunas_modelo)
+
+    usecols = list(dict.fromkeys(ID_COLUMNS + PLOT_COLUMNS + colunas_modelo))
+    dtypes = plan_dtypes(arquivo, usecols)
+
+    num_anomalias = 0
+    num_normais = 0
+    preview = None
+    instalacoes_anomalas = None
+    pontos_anomalos = None
+    chaves_anomalos = np.empty(0)
+    reservatorio = None
+    chaves_reservatorio = np.empty(0)
+
+    ## Somas para a matriz de correlação das colunas do modelo, calculada sem manter o arquivo em memória
+    n_total = 0
+    soma = np.zeros(len(colunas_modelo))
+    soma_produtos = np.zeros((len(colunas_modelo), len(colunas_modelo)))
+
+    rng = np.random.default_rng(random_state)
+
+    for chunk in pd.read_csv(arquivo, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        if preview is None:
+            preview = chunk[colunas_modelo].head(3)
+
+        chunk['anomaly'] = predict_anomalies(pipeline, chunk).astype('int8')
+
+        anomalias_chunk = int(chunk['anomaly'].sum())
+        num_anomalias += anomalias_chunk
+        num_normais += len(chunk) - anomalias_chunk
+
+        ## Mantém apenas a primeira linha anômala de cada instalação
+        anomalias = chunk.loc[chunk['anomaly'] == 1, ID_COLUMNS + PLOT_COLUMNS + ['anomaly']]
+        if instalacoes_anomalas is not None:
+            anomalias_unicas = pd.concat([instalacoes_anomalas, anomalias], ignore_index=True)
+        else:
+            anomalias_unicas = anomalias
+        instalacoes_anomalas = anomalias_unicas.drop_duplicates(subset=['clientCode', 'clientIndex'])
+
+        pontos_anomalos, chaves_anomalos = _reservoir_update(
+            pontos_anomalos, chaves_anomalos, anomalias[PLOT_COLUMNS], rng, tamanho_amostra_anomalias)
+
+        normais = chunk.loc[chunk['anomaly'] == 0, PLOT_COLUMNS]
+        reservatorio, chaves_reservatorio = _reservoir_update(
+            reservatorio, chaves_reservatorio, normais, rng, tamanho_amostra)
+
+        valores = chunk[colunas_modelo].to_numpy(dtype=np.float64)
+        n_total += len(valores)
+        soma += valores.sum(axis=0)
+        soma_produtos += valores.T @ valores
+
+    if instalacoes_anomalas is None:
+        instalacoes_anomalas = pd.DataFrame(columns=ID_COLUMNS + PLOT_COLUMNS + ['anomaly'])
+    instalacoes_anomalas = instalacoes_anomalas.sort_values(by='delta_time', ascending=False)
+
+    if reservatorio is None:
+        reservatorio = pd.DataFrame(columns=PLOT_COLUMNS, dtype='float32')
+    if pontos_anomalos is None:
+        pontos_anomalos = pd.DataFrame(columns=PLOT_COLUMNS, dtype='float32')
+
+    if n_total > 1:
+        media = soma / n_total
+        covariancia = (soma_produtos - n_total * np.outer(media, media)) / (n_total - 1)
+        desvio = np.sqrt(np.diag(covariancia))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlacao = covariancia / np.outer(desvio, desvio)
+    else:
+        correlacao = np.full((len(colunas_modelo), len(colunas_modelo)), np.nan)
+
+    return {
+        'num_anomalias': num_anomalias,
+        'num_normais': num_normais,
+        'preview': preview,
+        'instalacoes_anomalas': instalacoes_anomalas,
+        'normais_amostra': reservatorio,
+        'anomalias_pontos': pontos_anomalos,
+        'quantis_consumo': [
+            quantile_stats(reservatorio['consumo_horarizado'], 'Normal'),
+            quantile_stats(pontos_anomalos['consumo_horarizado'], 'Anomalia'),
+        ],
+        'correlacao': pd.DataFrame(correlacao, index=colunas_modelo, columns=colunas_modelo),
+    }
@@ -1,28 +1,56 @@
+import hashlib
+import os
+import sys
+
+## Módulos compartilhados com o notebook (instalacoes, calendario e previsao) ficam na pasta notebooks
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'notebooks')))
+
 import streamlit as st
 import pandas as pd
-import joblib
-from sklearn.preprocessing import StandardScaler
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import seaborn as sns
 import plotly.express as px
 import numpy as np
-from sklearn.metrics import mean_absolute_error, mean_squared_error, mean_absolute_percentage_error
 from sklearn.preprocessing import LabelEncoder
 import matplotlib.pyplot as plt
+from anomalias import load_inference_pipeline, score_csv_in_chunks
+from graficos import POINT_BUDGET, plot_anomaly_scatter, plot_quantile_boxplot
+from instalacoes import build_installation_index
+from calendario import season_labels
+from previsao import HoltWintersCache, get_or_fit
+from previsao_lote import FORECAST_MONTHS, FORECAST_TABLE_PATH, forecast_from_table, load_forecast_table
+
+@st.cache_resource
+def load_anomaly_pipeline():
+    return load_inference_pipeline()
 
 @st.cache_resource
-def load_anomaly_model():
-    return joblib.load('iso_forest_tuning_model.pkl')
+def load_forecast_cache():
+    return HoltWintersCache()
 
+## A data de modificação da tabela faz parte da chave do cache: quando o arquivo é criado ou regerado
+## pelo previsao_lote.py, a tabela é lida de novo (em vez de reaproveitar um None ou uma versão antiga)
 @st.cache_data
-def scale_data(df):
-    scaler = StandardScaler()
-    df_scaled = scaler.fit_transform(df)
-    return df_scaled
+def load_batch_forecasts(mtime):
+    return load_forecast_table()
+
+def forecast_table_mtime():
+    return os.path.getmtime(FORECAST_TABLE_PATH) if os.path.exists(FORECAST_TABLE_PATH) else None
+
+@st.cache_data
+def load_sample_installations():
+    df_50_instalacoes = pd.read_csv('df_50_instalacoes.csv')
+
+    label_encoder = LabelEncoder()
+    df_50_instalacoes['clientCode_encoded'] = label_encoder.fit_transform(df_50_instalacoes['clientCode'])
 
-def predict_anomalies(model, df_scaled):
-    labels = model.predict(df_scaled)
-    return pd.Series(labels).map({1: 0, -1: 1})
+    cols = ['clientCode_encoded'] + [col for col in df_50_instalacoes.columns if col != 'clientCode_encoded']
+    df_50_instalacoes = df_50_instalacoes[cols]
+
+    ## Estação do ano calculada pelo mesmo módulo de calendário do notebook
+    df_50_instalacoes['estacao'] = season_labels(pd.to_datetime(df_50_instalacoes['data_hora']))
+
+    ## Ordena uma única vez por instalação, para que cada instalação seja obtida por fatiamento
+    return build_installation_index(df_50_instalacoes, tempo=None, chaves=['clientCode_encoded', 'clientIndex'])
 
 
 st.image("galvao.png", width=350)
@@ -78,39 +106,43 @@ with tab2:
     """)
     
     
-    # Carregar o modelo de anomalias
-    iso_forest_model = load_anomaly_model()
+    # Carregar o pipeline de anomalias (scaler de treino + Isolation Forest)
+    anomaly_pipeline = load_anomaly_pipeline()
 
     uploaded_file = st.file_uploader("Carregar arquivo CSV", type="csv", key="anomalias")
 
     if uploaded_file is not None:
-        df_new = pd.read_csv(uploaded_file)
-
-        df_filtered = df_new.drop(columns=['clientCode', 'clientIndex', 'clientCode_encoded', 'delta_time', 'consumo_horarizado'])
-
-        st.write("Visualização dos primeiros 3 dados carregados:")
-        st.dataframe(df_filtered.head(3))
-
-        selected_columns = df_filtered.select_dtypes(include=["number"]).columns
-
-        if len(selected_columns) > 0:
-            df_selected = df_filtered[selected_columns]
-            df_scaled = scale_data(df_selected)
+        ## O arquivo é lido e classificado em pedaços; o resultado fica guardado na sessão
+        ## para que interações com outros componentes não reprocessem o arquivo inteiro.
+        ## A chave é o hash do conteúdo: outro arquivo com o mesmo nome e tamanho é classificado de novo
+        with uploaded_file.getbuffer() as conteudo:
+            chave_arquivo = hashlib.sha1(conteudo).hexdigest()
+        resultado_anomalias = None
+
+        if st.session_state.get('anomalias_arquivo') == chave_arquivo:
+            resultado_anomalias = st.session_state['anomalias_resultado']
+        else:
+            try:
+                with st.spinner('Classificando os dados carregados...'):
+                    resultado_anomalias = score_csv_in_chunks(uploaded_file, anomaly_pipeline)
+                st.session_state['anomalias_arquivo'] = chave_arquivo
+                st.session_state['anomalias_resultado'] = resultado_anomalias
+            except ValueError as e:
+                st.error(str(e))
 
-            df_new['anomaly'] = predict_anomalies(iso_forest_model, df_scaled)
+        if resultado_anomalias is not None:
+            st.write("Visualização dos primeiros 3 dados carregados:")
+            st.dataframe(resultado_anomalias['preview'])
 
-            num_anomalias = df_new[df_new['anomaly'] == 1].shape[0]
-            num_normais = df_new[df_new['anomaly'] == 0].shape[0]
+            num_anomalias = resultado_anomalias['num_anomalias']
+            num_normais = resultado_anomalias['num_normais']
 
             st.markdown(f"<span style='color: red;'>**Número de anomalias detectadas:** {num_anomalias}</span>", unsafe_allow_html=True)
             st.markdown(f"<span style='color: green;'>**Número de amostras normais:** {num_normais}</span>", unsafe_allow_html=True)
 
             st.subheader("Instalações com Dados Anômalos")
 
-            df_anomalies = df_new[df_new['anomaly'] == 1][['clientCode', 'clientCode_encoded', 'clientIndex', 'delta_time', 'consumo_horarizado', 'anomaly']]
-
-            df_anomalies_unique = df_anomalies.drop_duplicates(subset=['clientCode', 'clientIndex'])
-            df_anomalies_unique = df_anomalies_unique.sort_values(by='delta_time', ascending=False)
+            df_anomalies_unique = resultado_anomalias['instalacoes_anomalas']
 
             st.write("Tabela de instalações que possuem dados anômalos (Em primeiro, dados com tempo muito longo entre medições):")
             st.dataframe(df_anomalies_unique)
@@ -118,26 +150,36 @@ with tab2:
             st.subheader("Visualização de Anomalias")
             st.write("Gráfico de contagem de amostras normais vs anomalias:")
 
-            st.bar_chart(df_new['anomaly'].value_counts())
+            st.bar_chart(pd.Series({0: num_normais, 1: num_anomalias}, name='count'))
 
             st.subheader("Scatterplot de Anomalias vs Delta Time")
             st.write("O gráfico abaixo mostra a relação entre as anomalias detectadas e o tempo decorrido desde a última medição.")
             st.write("As amostras normais estão em azul e as anomalias estão em vermelho. As principais anomalias são aquelas em que se passou muito tempo entre uma medição e outra.")
+            st.write("Todas as anomalias são desenhadas; as amostras normais são reduzidas para manter o gráfico rápido em arquivos grandes.")
+
+            col_modo, col_pontos = st.columns([1, 1])
+            with col_modo:
+                modo_grafico = st.radio("Pontos normais:", ['Amostra estratificada', 'Densidade (hexbin)'], horizontal=True)
+            with col_pontos:
+                point_budget = st.slider("Máximo de pontos normais no gráfico:", 1_000, 50_000, POINT_BUDGET, step=1_000)
+
             fig, ax = plt.subplots(figsize=(10, 6))
-            sns.scatterplot(
-                x='delta_time', y='consumo_horarizado', hue='anomaly', data=df_new, palette={0: 'blue', 1: 'red'}, alpha=0.7, ax=ax
+            plot_anomaly_scatter(
+                ax,
+                resultado_anomalias['normais_amostra'],
+                resultado_anomalias['anomalias_pontos'],
+                point_budget=point_budget,
+                modo='densidade' if modo_grafico == 'Densidade (hexbin)' else 'amostra',
             )
             ax.set_title('Anomalias vs Delta Time')
             ax.set_xlabel('Delta Time (horas)')
             ax.set_ylabel('Variação de Consumo por Hora')
-            handles, labels = ax.get_legend_handles_labels()
-            ax.legend(handles=handles, labels=['Normal', 'Anomalia'], title='Classificação')
             ax.grid(True)
             st.pyplot(fig)
             
             st.subheader("Distribuição de Consumo Diário (Normais vs Anômalias)")
             fig_box, ax_box = plt.subplots(figsize=(10, 6))
-            sns.boxplot(x='anomaly', y='consumo_horarizado', data=df_new, palette='Set1', ax=ax_box)
+            plot_quantile_boxplot(ax_box, resultado_anomalias['quantis_consumo'])
             ax_box.set_title("Boxplot de Consumo Diário - Normais vs Anômalias")
             ax_box.set_xlabel("Classificação")
             ax_box.set_ylabel("Consumo Horarizado (m³)")
@@ -145,13 +187,11 @@ with tab2:
 
             st.subheader("Mapa de Correlação das Variáveis")
             fig_corr, ax_corr = plt.subplots(figsize=(10, 6))
-            corr_matrix = df_new[selected_columns].corr()
+            corr_matrix = resultado_anomalias['correlacao']
             sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', ax=ax_corr)
             ax_corr.set_title("Mapa de Correlação das Variáveis")
             st.pyplot(fig_corr)
             
-        else:
-            st.warning("Não foram encontradas colunas numéricas no arquivo carregado.")
     else:
         st.warning("Por favor, carregue um arquivo CSV.")
 
@@ -177,13 +217,7 @@ with tab3:
     uploaded_file = True
     if uploaded_file is not None:
         #df_50_instalacoes = pd.read_csv(uploaded_file)
-        df_50_instalacoes = pd.read_csv('df_50_instalacoes.csv')
-        
-        label_encoder = LabelEncoder()
-        df_50_instalacoes['clientCode_encoded'] = label_encoder.fit_transform(df_50_instalacoes['clientCode'])
-        
-        cols = ['clientCode_encoded'] + [col for col in df_50_instalacoes.columns if col != 'clientCode_encoded']
-        df_50_instalacoes = df_50_instalacoes[cols]
+        df_50_instalacoes, indice_instalacoes = load_sample_installations()
         
         st.write("Visualização dos primeiros 3 dados carregados:")
         st.dataframe(df_50_instalacoes.head(3))
@@ -191,12 +225,13 @@ with tab3:
         client_code = st.selectbox("Selecione o clientCode:", df_50_instalacoes['clientCode_encoded'].unique())
 
         ## Identificar os clientIndices associados ao client
-        client_indices = df_50_instalacoes[df_50_instalacoes['clientCode_encoded'] == client_code]['clientIndex'].unique()
+        instalacoes = indice_instalacoes.chaves
+        client_indices = instalacoes.loc[instalacoes['clientCode_encoded'] == client_code, 'clientIndex'].unique()
 
         ## Selecionar um clientIndex baseado no clientCode
         client_index = st.selectbox("Selecione o clientIndex:", client_indices)
         
-        instalacao_df = df_50_instalacoes[(df_50_instalacoes['clientCode_encoded'] == client_code) & (df_50_instalacoes['clientIndex'] == client_index)].copy()
+        instalacao_df = indice_instalacoes.get(df_50_instalacoes, client_code, client_index).copy()
         
         instalacao_mensal_df = instalacao_df.groupby('ano_mes')['consumo_dia'].sum().reset_index()
 
@@ -235,7 +270,7 @@ with tab3:
         st.plotly_chart(fig_mudanca_percentual)
         
         # Gráfico de Barras da Média de Consumo Mensal por Estação do Ano
-        media_consumo_estacao = instalacao_df.groupby('estacao')['consumo_dia'].mean().reset_index()
+        media_consumo_estacao = instalacao_df.groupby('estacao', observed=True)['consumo_dia'].mean().reset_index()
 
         media_consumo_estacao = media_consumo_estacao.sort_values(by='consumo_dia')
         max_consumo_estacao = media_consumo_estacao.loc[media_consumo_estacao['consumo_dia'].idxmax()]
@@ -267,88 +302,31 @@ with tab3:
 
         ##### Previsão de Consumo com Holt-Winters #####
         st.header("Previsão de Consumo com Holt-Winters")
-        st.write('Aguarde enquanto o modelo Holt-Winters é ajustado e a previsão é feita...')
+        ## Previsões geradas em lote (previsao_lote.py) são usadas quando disponíveis, sem ajustar o modelo aqui
+        tabela_previsoes = load_batch_forecasts(forecast_table_mtime())
+        previsao_lote = forecast_from_table(tabela_previsoes, instalacao_df['clientCode'].iloc[0], client_index, FORECAST_MONTHS)
 
-        # Parâmetros a serem testados
-        trend_options = ['add', 'mul', None]
-        seasonal_options = ['add', 'mul', None]
-        seasonal_periods = [i for i in range(2, 31)]  
-        damped_trend_options = [True, False]
+        if previsao_lote is None:
+            st.write('Aguarde enquanto o modelo Holt-Winters é ajustado e a previsão é feita...')
 
-        
-        # Variáveis para armazenar os melhores resultados
-        best_mae = np.inf
-        best_mse = np.inf
-        best_mape = np.inf
-        best_params = {}
-        
-        train_size = int(len(instalacao_mensal_df) * 0.8)
-        train, test = instalacao_mensal_df.iloc[:train_size], instalacao_mensal_df.iloc[train_size:]
-        
-        
-        
-        for trend in trend_options:
-            for seasonal in seasonal_options:
-                for period in seasonal_periods:
-                    for damped in damped_trend_options:
-                        try:
-                            ## Apenas testar damped_trend se houver uma tendência
-                            if trend is None and damped:
-                                continue
-                            
-                            ## Definir e ajustar o modelo Holt-Winters com os dados de treino
-                            modelo_treino = ExponentialSmoothing(
-                                train['consumo_dia'], 
-                                trend=trend, 
-                                seasonal=seasonal,
-                                seasonal_periods=period,
-                                damped_trend=damped
-                            )
-
-                            ajuste_treino = modelo_treino.fit()
-
-                            ## Fazer a previsão para o número de meses no conjunto de teste
-                            previsao_teste = ajuste_treino.forecast(len(test))
-
-                            ## Calcular as métricas
-                            mae = mean_absolute_error(test['consumo_dia'], previsao_teste)
-                            mse = mean_squared_error(test['consumo_dia'], previsao_teste)
-                            mape = mean_absolute_percentage_error(test['consumo_dia'], previsao_teste)
-
-                            ## Comparar o erro e armazenar o melhor modelo (baseado no MAE)
-                            if mae < best_mae:
-                                best_mae = mae
-                                best_mse = mse
-                                best_mape = mape
-                                best_params = {
-                                    'trend': trend,
-                                    'seasonal': seasonal,
-                                    'seasonal_periods': period,
-                                    'damped_trend': damped
-                                }
-
-                        except Exception as e:
-                            print(f"Erro com a configuração {trend}, {seasonal}, {period}, damped={damped}: {e}")
-    
-    
-    
-        modelo_treino = ExponentialSmoothing(
-            instalacao_mensal_df['consumo_dia'], 
-            trend=best_params['trend'],      
-            seasonal=best_params['seasonal'],   
-            seasonal_periods=best_params['seasonal_periods'],
-            damped_trend=best_params['damped_trend']  
-        )
+            ## Busca dos melhores parâmetros e ajuste do modelo, reaproveitados do cache quando a instalação já foi ajustada
+            forecast_cache = load_forecast_cache()
+            resultado_previsao = get_or_fit(forecast_cache, client_code, client_index, instalacao_mensal_df)
+            ajuste_treino = resultado_previsao['ajuste']
 
-        ajuste_treino = modelo_treino.fit()
+            if 'ajustes_pulados' in resultado_previsao:
+                st.caption(f"Grid Search: {resultado_previsao['ajustes_realizados']} combinações ajustadas e {resultado_previsao['ajustes_pulados']} combinações inválidas puladas.")
 
         ## Visualização da previsão
         st.subheader("Previsão de Consumo Mensal")
         
-        months_to_predict = st.selectbox("Selecione o número de meses para prever:", range(1, 25))
+        months_to_predict = st.selectbox("Selecione o número de meses para prever:", range(1, FORECAST_MONTHS + 1))
 
         ## Prever o consumo para o número de meses selecionado
-        previsao_mensal = ajuste_treino.forecast(months_to_predict)
+        if previsao_lote is not None:
+            previsao_mensal = previsao_lote.iloc[:months_to_predict]
+        else:
+            previsao_mensal = ajuste_treino.forecast(months_to_predict)
 
         if months_to_predict == 1:
             st.write(f"Previsão de consumo para essa instalação para o próximo mês:")
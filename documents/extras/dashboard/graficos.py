@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+# Número padrão de pontos normais desenhados no gráfico de dispersão (as anomalias são sempre desenhadas)
+POINT_BUDGET = 10_000
+N_STRATA = 20
+
+
+def quantile_stats(valores, label):
+    """
+    Calcula as estatísticas de um boxplot (quartis e bigodes de 1,5 * IQR) a partir dos valores,
+    no formato aceito por Axes.bxp, para que o gráfico seja desenhado sem as linhas originais.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        return None
+
+    q1, mediana, q3 = np.quantile(valores, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+
+    return {
+        'label': label,
+        'med': mediana,
+        'q1': q1,
+        'q3': q3,
+        'whislo': dentro.min() if len(dentro) else q1,
+        'whishi': dentro.max() if len(dentro) else q3,
+        'fliers': [],
+    }
+
+
+def stratified_sample(df, coluna, n, n_strata=N_STRATA, random_state=42):
+    """
+    Amostra até n linhas distribuídas igualmente entre faixas (quantis) da coluna,
+    para que as caudas da distribuição continuem visíveis no gráfico.
+    """
+    if len(df) <= n:
+        return df
+
+    faixas = pd.qcut(df[coluna].rank(method='first'), q=n_strata, labels=False)
+    por_faixa = max(1, n // n_strata)
+    return (
+        df.groupby(faixas, group_keys=False)
+        .apply(lambda grupo: grupo.sample(n=min(len(grupo), por_faixa), random_state=random_state))
+    )
+
+
+def plot_anomaly_scatter(ax, normais, anomalias, x='delta_time', y='consumo_horarizado',
+                         point_budget=POINT_BUDGET, modo='amostra'):
+    """
+    Desenha todas as anomalias e uma versão reduzida dos pontos normais:
+    - modo 'amostra': amostra estratificada de até point_budget pontos normais;
+    - modo 'densidade': histograma hexagonal (hexbin) dos pontos normais.
+    """
+    if modo == 'densidade' and len(normais) > 0:
+        hb = ax.hexbin(normais[x], normais[y], gridsize=60, bins='log', cmap='Blues', mincnt=1)
+        ax.figure.colorbar(hb, ax=ax, label='Amostras normais (log)')
+    else:
+        normais_plot = stratified_sample(normais, x, point_budget)
+        ax.scatter(normais_plot[x], normais_plot[y], c='blue', alpha=0.7, s=12, label='Normal', rasterized=True)
+
+    ax.scatter(anomalias[x], anomalias[y], c='red', alpha=0.7, s=12, label='Anomalia', rasterized=True)
+    ax.legend(title='Classificação')
+
+
+def plot_quantile_boxplot(ax, estatisticas):
+    """Desenha o boxplot a partir das estatísticas pré-calculadas (sem outliers individuais)."""
+    estatisticas = [e for e in estatisticas if e is not None]
+    cores = ['#e41a1c', '#377eb8']
+    caixas = ax.bxp(estatisticas, showfliers=False, patch_artist=True)
+    for caixa, cor in zip(caixas['boxes'], cores):
+        caixa.set_facecolor(cor)
@@ -0,0 +1,147 @@
+"""
+Previsão de consumo em lote com Holt-Winters para todas as instalações de um CSV de consumo diário.
+
+Uso:
+    python previsao_lote.py df_50_instalacoes.csv --saida previsoes_holt_winters.csv --meses 24 --workers 8
+
+O arquivo gerado é lido pela aba "Previsão de Consumo" da dashboard, que passa a exibir a previsão
+sem precisar ajustar o modelo no momento em que a instalação é selecionada.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+## O módulo previsao é compartilhado com o notebook e fica na pasta notebooks
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'notebooks')))
+from previsao import fit_best_model, search_best_params, split_train_test
+
+
+FORECAST_TABLE_PATH = 'previsoes_holt_winters.csv'
+FORECAST_MONTHS = 24
+
+FORECAST_COLUMNS = [
+    'clientCode', 'clientCode_encoded', 'clientIndex', 'ano_mes', 'horizonte', 'previsao',
+    'mae', 'mse', 'mape', 'trend', 'seasonal', 'seasonal_periods', 'damped_trend'
+]
+
+
+def build_monthly_series(df):
+    """Agrupa o consumo diário por instalação e mês, como na aba de previsão da dashboard."""
+    df = df.copy()
+    label_encoder = LabelEncoder()
+    df['clientCode_encoded'] = label_encoder.fit_transform(df['clientCode'])
+
+    mensal = (
+        df.groupby(['clientCode', 'clientCode_encoded', 'clientIndex', 'ano_mes'])['consumo_dia']
+        .sum()
+        .reset_index()
+    )
+
+    for (client_code, client_code_encoded, client_index), grupo in mensal.groupby(['clientCode', 'clientCode_encoded', 'clientIndex']):
+        instalacao_mensal_df = grupo[['ano_mes', 'consumo_dia']].set_index('ano_mes')
+        yield client_code, int(client_code_encoded), int(client_index), instalacao_mensal_df
+
+
+def forecast_installation(client_code, client_code_encoded, client_index, instalacao_mensal_df, meses=FORECAST_MONTHS):
+    """Roda o Grid Search, ajusta o melhor modelo e prevê os próximos meses de uma instalação."""
+    train, test = split_train_test(instalacao_mensal_df)
+
+    ## Cada instalação roda em um processo, então a busca interna não abre outro pool
+    resultado = search_best_params(train, test, n_jobs=1)
+    best_params = resultado['best_params']
+    if not best_params:
+        print(f"Nenhuma configuração válida para a instalação {client_code_encoded} - {client_index}")
+        return None
+
+    ajuste = fit_best_model(instalacao_mensal_df, best_params)
+    previsao_mensal = ajuste.forecast(meses)
+
+    return pd.DataFrame({
+        'clientCode': client_code,
+        'clientCode_encoded': client_code_encoded,
+        'clientIndex': client_index,
+        'ano_mes': previsao_mensal.index,
+        'horizonte': range(1, len(previsao_mensal) + 1),
+        'previsao': previsao_mensal.values,
+        'mae': resultado['mae'],
+        'mse': resultado['mse'],
+        'mape': resultado['mape'],
+        'trend': best_params['trend'],
+        'seasonal': best_params['seasonal'],
+        'seasonal_periods': best_params['seasonal_periods'],
+        'damped_trend': best_params['damped_trend'],
+    })
+
+
+def run_batch(df, meses=FORECAST_MONTHS, workers=None):
+    """Prevê o consumo de todas as instalações em paralelo e retorna uma única tabela."""
+    resultados = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(forecast_installation, client_code, client_code_encoded, client_index, serie, meses): (client_code_encoded, client_index)
+            for client_code, client_code_encoded, client_index, serie in build_monthly_series(df)
+        }
+        for future in as_completed(futures):
+            client_code_encoded, client_index = futures[future]
+            try:
+                previsao_df = future.result()
+            except Exception as e:
+                print(f"Erro ao prever a instalação {client_code_encoded} - {client_index}: {e}")
+                continue
+            if previsao_df is not None:
+                resultados.append(previsao_df)
+
+    if not resultados:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+
+    tabela = pd.concat(resultados, ignore_index=True)
+    return tabela.sort_values(['clientCode_encoded', 'clientIndex', 'horizonte']).reset_index(drop=True)[FORECAST_COLUMNS]
+
+
+def load_forecast_table(path=FORECAST_TABLE_PATH):
+    """Carrega a tabela gerada por este script, ou None se ela ainda não existir."""
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, parse_dates=['ano_mes'])
+
+
+def forecast_from_table(tabela, client_code, client_index, meses):
+    """
+    Retorna a previsão da instalação para os próximos meses a partir da tabela em lote,
+    ou None se a instalação não estiver na tabela ou o horizonte pedido for maior que o calculado.
+    """
+    if tabela is None:
+        return None
+
+    linhas = tabela[(tabela['clientCode'] == client_code) & (tabela['clientIndex'] == client_index)]
+    if len(linhas) < meses:
+        return None
+
+    linhas = linhas.sort_values('horizonte').iloc[:meses]
+    return pd.Series(linhas['previsao'].values, index=pd.DatetimeIndex(linhas['ano_mes']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Previsão de consumo em lote com Holt-Winters.')
+    parser.add_argument('entrada', help='CSV de consumo diário (ex.: df_50_instalacoes.csv)')
+    parser.add_argument('--saida', default=FORECAST_TABLE_PATH, help='CSV com a tabela de previsões')
+    parser.add_argument('--meses', type=int, default=FORECAST_MONTHS, help='Número de meses a prever')
+    parser.add_argument('--workers', type=int, default=None, help='Número de processos (padrão: todos os núcleos)')
+    args = parser.parse_args()
+
+    inicio = time.time()
+    df = pd.read_csv(args.entrada)
+    tabela = run_batch(df, meses=args.meses, workers=args.workers)
+    tabela.to_csv(args.saida, index=False)
+
+    n_instalacoes = tabela[['clientCode', 'clientIndex']].drop_duplicates().shape[0]
+    print(f"{n_instalacoes} instalações previstas em {time.time() - inicio:.1f}s. Tabela salva em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV
+
+from avaliacao import silhouette_scorer
+
+
+# Grade de hiperparâmetros do Isolation Forest usada na decisão do modelo final (seção 16)
+ISOLATION_FOREST_GRID = {
+    'n_estimators': [100, 150, 200],
+    'max_samples': [0.8, 1.0],
+    'max_features': [0.8, 1.0],
+    'contamination': [0.05, 0.1, 'auto'],
+    'bootstrap': [False, True],
+}
+
+HALVING_FACTOR = 3
+
+
+def isolation_forest_halving_search(X, param_grid=ISOLATION_FOREST_GRID, scoring=None, factor=HALVING_FACTOR,
+                                    max_amostras=None, cv=3, n_jobs=-1, random_state=42, verbose=1):
+    """
+    Busca dos hiperparâmetros do Isolation Forest por successive halving: todas as combinações são avaliadas
+    em subamostras pequenas e apenas a fração 1/factor com melhor pontuação passa para a rodada seguinte,
+    com factor vezes mais linhas, até a última rodada usar max_amostras linhas (todas, se None).
+    As combinações de cada rodada são treinadas em paralelo (n_jobs) e a pontuação padrão é a silhueta
+    simplificada, calculada apenas com predict. O melhor modelo não é treinado novamente (refit=False):
+    o treino final é feito uma única vez com best_params_.
+    """
+    if scoring is None:
+        scoring = silhouette_scorer('simplificada')
+
+    search = HalvingGridSearchCV(
+        IsolationForest(random_state=random_state, n_jobs=1),
+        param_grid,
+        factor=factor,
+        resource='n_samples',
+        max_resources=min(max_amostras or len(X), len(X)),
+        min_resources='exhaust',
+        cv=cv,
+        scoring=scoring,
+        refit=False,
+        n_jobs=n_jobs,
+        random_state=random_state,
+        verbose=verbose,
+    )
+    return search.fit(np.asarray(X))
+
+
+def halving_results(search):
+    """Tabela com a pontuação de cada combinação em cada rodada (a última rodada de cada uma primeiro)."""
+    resultados = pd.DataFrame(search.cv_results_)
+    colunas = ['iter', 'n_resources', 'params', 'mean_test_score', 'std_test_score', 'mean_fit_time']
+    return resultados[colunas].sort_values(['iter', 'mean_test_score'], ascending=False).reset_index(drop=True)
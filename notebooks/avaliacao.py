@@ -0,0 +1,197 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import stats
+from sklearn.metrics import silhouette_samples
+
+
+# Tamanho da amostra e número de repetições da silhueta amostrada
+SILHOUETTE_SAMPLE_SIZE = 10_000
+SILHOUETTE_REPEATS = 5
+MIN_PER_CLUSTER = 50
+CHUNK_SIZE = 100_000
+
+
+def _as_arrays(X, labels):
+    X = np.asarray(X, dtype=np.float64)
+    labels = np.asarray(labels)
+    return X, labels
+
+
+def stratified_indices(labels, n_amostras, min_por_cluster=MIN_PER_CLUSTER, rng=None):
+    """
+    Sorteia até n_amostras posições mantendo a proporção de cada cluster, com um mínimo de
+    min_por_cluster por cluster (para que clusters pequenos, como as anomalias, estejam na amostra).
+    Retorna as posições e o peso de cada posição (fração do cluster na base / fração na amostra).
+    """
+    rng = np.random.default_rng(rng)
+    clusters, inversos, contagens = np.unique(labels, return_inverse=True, return_counts=True)
+
+    alvo = np.maximum(np.round(contagens / len(labels) * n_amostras), min_por_cluster)
+    alvo = np.minimum(alvo, contagens).astype(int)
+
+    ## Ordena as posições por cluster uma única vez e sorteia dentro de cada bloco
+    ordem = np.argsort(inversos, kind='stable')
+    inicios = np.concatenate([[0], np.cumsum(contagens)[:-1]])
+    indices = np.concatenate([
+        ordem[inicio + rng.choice(contagem, size=quantidade, replace=False)]
+        for inicio, contagem, quantidade in zip(inicios, contagens, alvo)
+    ])
+
+    pesos_cluster = (contagens / len(labels)) / (alvo / alvo.sum())
+    return indices, pesos_cluster[inversos[indices]]
+
+
+def sampled_silhouette(X, labels, n_amostras=SILHOUETTE_SAMPLE_SIZE, repeticoes=SILHOUETTE_REPEATS,
+                       estratificada=True, confianca=0.95, random_state=42):
+    """
+    Coeficiente de silhueta estimado em amostras de tamanho fixo (custo independente do tamanho da base).
+    A amostragem estratificada garante a presença de todos os clusters e é reponderada para estimar a média
+    da base inteira. Retorna a estimativa, o desvio entre repetições e o intervalo de confiança.
+    """
+    X, labels = _as_arrays(X, labels)
+    if len(np.unique(labels)) < 2:
+        return {'silhueta': np.nan, 'desvio': np.nan, 'ic_inferior': np.nan, 'ic_superior': np.nan, 'repeticoes': 0}
+
+    rng = np.random.default_rng(random_state)
+    estimativas = []
+    for _ in range(repeticoes):
+        if estratificada:
+            indices, pesos = stratified_indices(labels, n_amostras, rng=rng)
+        else:
+            indices = rng.choice(len(labels), size=min(n_amostras, len(labels)), replace=False)
+            pesos = np.ones(len(indices))
+        if len(np.unique(labels[indices])) < 2:
+            continue
+        valores = silhouette_samples(X[indices], labels[indices])
+        estimativas.append(np.average(valores, weights=pesos))
+
+    estimativas = np.asarray(estimativas)
+    media = estimativas.mean()
+    desvio = estimativas.std(ddof=1) if len(estimativas) > 1 else 0.0
+    margem = stats.t.ppf((1 + confianca) / 2, max(len(estimativas) - 1, 1)) * desvio / np.sqrt(len(estimativas))
+
+    return {
+        'silhueta': media,
+        'desvio': desvio,
+        'ic_inferior': media - margem,
+        'ic_superior': media + margem,
+        'repeticoes': len(estimativas),
+    }
+
+
+def simplified_silhouette(X, labels, chunk_size=CHUNK_SIZE):
+    """
+    Silhueta simplificada: a distância média ao próprio cluster é trocada pela distância ao seu centróide
+    e a distância ao cluster vizinho pela distância ao centróide mais próximo. Custo O(n * k), calculado
+    em blocos de chunk_size linhas para limitar a memória.
+    """
+    X, labels = _as_arrays(X, labels)
+    clusters, inversos = np.unique(labels, return_inverse=True)
+    if len(clusters) < 2:
+        return np.nan
+
+    contagens = np.bincount(inversos)
+    centroides = np.zeros((len(clusters), X.shape[1]))
+    np.add.at(centroides, inversos, X)
+    centroides /= contagens[:, None]
+
+    soma = 0.0
+    for inicio in range(0, len(X), chunk_size):
+        bloco = X[inicio:inicio + chunk_size]
+        proprio = inversos[inicio:inicio + chunk_size]
+
+        distancias = np.sqrt(((bloco[:, None, :] - centroides[None, :, :]) ** 2).sum(axis=2))
+        a = distancias[np.arange(len(bloco)), proprio]
+        distancias[np.arange(len(bloco)), proprio] = np.inf
+        b = distancias.min(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = np.where(np.maximum(a, b) > 0, (b - a) / np.maximum(a, b), 0.0)
+        ## Como na silhueta tradicional, pontos sozinhos no seu cluster recebem 0
+        s[contagens[proprio] == 1] = 0.0
+        soma += s.sum()
+
+    return soma / len(X)
+
+
+def silhouette_scorer(metodo='simplificada', **kwargs):
+    """
+    Cria uma função de pontuação para GridSearchCV/RandomizedSearchCV (scoring=...).
+    O estimador já ajustado pela busca apenas prevê os rótulos (sem um novo fit) e a silhueta é calculada
+    pelo método escolhido: 'simplificada' (centróides) ou 'amostrada' (amostra estratificada).
+    Retorna -1 quando o modelo coloca todos os pontos no mesmo grupo.
+    """
+    def scorer(estimator, X, y=None):
+        labels = estimator.predict(X)
+        if len(np.unique(labels)) < 2:
+            return -1.0
+        if metodo == 'amostrada':
+            return sampled_silhouette(X, labels, **kwargs)['silhueta']
+        return simplified_silhouette(X, labels, **kwargs)
+
+    return scorer
+
+
+def _sorted_by_cluster(valores, codigos, n_clusters):
+    """Ordena os valores uma única vez por (cluster, valor) e retorna o array de cada cluster, já ordenado."""
+    validos = ~np.isnan(valores)
+    valores, codigos = valores[validos], codigos[validos]
+    ordem = np.lexsort((valores, codigos))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codigos, minlength=n_clusters))])
+    ordenados = valores[ordem]
+    return [ordenados[offsets[c]:offsets[c + 1]] for c in range(n_clusters)]
+
+
+def ks_statistic(a, b):
+    """
+    Estatística KS de duas amostras já ordenadas: maior diferença entre as distribuições acumuladas,
+    avaliadas com searchsorted em todos os valores das duas amostras.
+    """
+    todos = np.concatenate([a, b])
+    cdf_a = np.searchsorted(a, todos, side='right') / len(a)
+    cdf_b = np.searchsorted(b, todos, side='right') / len(b)
+    return np.abs(cdf_a - cdf_b).max()
+
+
+def _ks_feature(coluna, valores, codigos, clusters):
+    ordenados = _sorted_by_cluster(valores, codigos, len(clusters))
+    linhas = []
+    for i, j in combinations(range(len(clusters)), 2):
+        a, b = ordenados[i], ordenados[j]
+        if len(a) == 0 or len(b) == 0:
+            continue
+        linhas.append((coluna, clusters[i], clusters[j], ks_statistic(a, b), len(a) * len(b) / (len(a) + len(b))))
+    return linhas
+
+
+def ks_matrix(df, colunas, cluster='cluster', n_jobs=None):
+    """
+    Teste de Kolmogorov-Smirnov entre todos os pares de clusters para cada coluna.
+    Cada coluna é ordenada uma única vez por cluster e as estatísticas de todos os pares são calculadas a
+    partir dos arrays ordenados; com n_jobs, as colunas são processadas em paralelo.
+    O p-value é o assintótico bilateral (o mesmo de scipy.stats.ks_2samp com method='asymp').
+    Retorna uma tabela com as colunas feature, cluster_a, cluster_b, stat e pvalue.
+    """
+    codigos, clusters = pd.factorize(df[cluster], sort=True)
+    validos = codigos >= 0
+    codigos = codigos[validos]
+
+    tarefas = (
+        delayed(_ks_feature)(coluna, df[coluna].to_numpy(dtype=np.float64)[validos], codigos, clusters)
+        for coluna in colunas
+    )
+    if n_jobs is None:
+        linhas = [funcao(*args) for funcao, args, _ in tarefas]
+    else:
+        linhas = Parallel(n_jobs=n_jobs)(tarefas)
+
+    resultados = pd.DataFrame(
+        [linha for linhas_coluna in linhas for linha in linhas_coluna],
+        columns=['feature', 'cluster_a', 'cluster_b', 'stat', 'n_efetivo'],
+    )
+    ## Distribuição de Kolmogorov para o tamanho efetivo m * n / (m + n), calculada de uma vez para todos os pares
+    resultados['pvalue'] = np.clip(stats.kstwo.sf(resultados['stat'], np.round(resultados['n_efetivo'])), 0, 1)
+    return resultados.drop(columns='n_efetivo')
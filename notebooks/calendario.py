@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+
+# Estações do ano no Brasil (hemisfério sul), na ordem usada na codificação cíclica
+SEASONS = ['Verão', 'Outono', 'Inverno', 'Primavera']
+
+# Feriados nacionais de data fixa (mês, dia)
+FIXED_HOLIDAYS = [
+    (1, 1),    # Confraternização Universal
+    (4, 21),   # Tiradentes
+    (5, 1),    # Dia do Trabalho
+    (9, 7),    # Independência
+    (10, 12),  # Nossa Senhora Aparecida
+    (11, 2),   # Finados
+    (11, 15),  # Proclamação da República
+    (12, 25),  # Natal
+]
+
+# Feriados nacionais de data fixa válidos apenas a partir de um ano (mês, dia, primeiro ano)
+FIXED_HOLIDAYS_SINCE = [
+    (11, 20, 2024),  # Dia Nacional de Zumbi e da Consciência Negra (Lei 14.759/2023)
+]
+
+# Feriado estadual do Rio Grande do Sul (só incluído com estaduais=True)
+RS_HOLIDAYS = [(9, 20)]  # Revolução Farroupilha
+
+# Feriados móveis, em dias a partir do domingo de Páscoa
+EASTER_OFFSETS = [
+    -48,  # Segunda-feira de Carnaval
+    -47,  # Terça-feira de Carnaval
+    -2,   # Sexta-feira Santa
+    60,   # Corpus Christi
+]
+
+
+def _season_table():
+    """
+    Tabela com a estação de cada (mês, dia), indexada por mes * 32 + dia:
+    - Verão: 21 de dezembro a 20 de março
+    - Outono: 21 de março a 20 de junho
+    - Inverno: 21 de junho a 20 de setembro
+    - Primavera: 21 de setembro a 20 de dezembro
+    """
+    tabela = np.zeros(13 * 32, dtype=np.int8)
+    for mes in range(1, 13):
+        for dia in range(1, 32):
+            ## As estações começam no dia 21 de março, junho, setembro e dezembro
+            if mes % 3 == 0 and dia < 21:
+                tabela[mes * 32 + dia] = (mes // 3 - 1) % 4
+            else:
+                tabela[mes * 32 + dia] = (mes // 3) % 4
+    return tabela
+
+
+SEASON_TABLE = _season_table()
+
+## Coordenadas de cada estação no círculo trigonométrico (valores muito próximos de 0 viram 0)
+_ANGULOS = np.arange(len(SEASONS)) / len(SEASONS) * 2 * np.pi
+SEASON_COS = np.where(np.abs(np.cos(_ANGULOS)) < 1e-10, 0.0, np.cos(_ANGULOS))
+SEASON_SIN = np.where(np.abs(np.sin(_ANGULOS)) < 1e-10, 0.0, np.sin(_ANGULOS))
+
+
+def season_codes(datas):
+    """Código da estação (0: Verão, 1: Outono, 2: Inverno, 3: Primavera) de cada data, por consulta na tabela."""
+    datas = pd.DatetimeIndex(datas)
+    return SEASON_TABLE[datas.month.to_numpy() * 32 + datas.day.to_numpy()]
+
+
+def season_labels(datas):
+    """Estação do ano de cada data, como categórica ordenada (Verão, Outono, Inverno, Primavera)."""
+    return pd.Categorical.from_codes(season_codes(datas), categories=SEASONS, ordered=True)
+
+
+def easter_dates(anos):
+    """Domingo de Páscoa de cada ano (algoritmo de Meeus/Jones/Butcher), vetorizado sobre os anos."""
+    a = np.asarray(anos, dtype=np.int64)
+    g = a % 19
+    b, c = a // 100, a % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    h = (19 * g + b - d - (b - f + 1) // 3 + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (g + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    dia = (h + l - 7 * m + 114) % 31 + 1
+    return pd.to_datetime(pd.DataFrame({'year': a, 'month': mes, 'day': dia})).to_numpy(dtype='datetime64[D]')
+
+
+def holiday_dates(anos, estaduais=False):
+    """Datas dos feriados nacionais (e do RS, se estaduais=True) dos anos informados."""
+    anos = np.unique(np.asarray(anos, dtype=np.int64))
+    fixos = FIXED_HOLIDAYS + (RS_HOLIDAYS if estaduais else [])
+
+    datas = [
+        pd.to_datetime(pd.DataFrame({'year': anos, 'month': mes, 'day': dia})).to_numpy(dtype='datetime64[D]')
+        for mes, dia in fixos
+    ]
+    ## Feriados instituídos recentemente só entram nos anos em que já valiam
+    for mes, dia, inicio in FIXED_HOLIDAYS_SINCE:
+        anos_validos = anos[anos >= inicio]
+        if len(anos_validos) > 0:
+            datas.append(pd.to_datetime(pd.DataFrame({'year': anos_validos, 'month': mes, 'day': dia})).to_numpy(dtype='datetime64[D]'))
+    pascoa = easter_dates(anos)
+    datas += [pascoa + np.timedelta64(deslocamento, 'D') for deslocamento in EASTER_OFFSETS]
+    return np.unique(np.concatenate(datas)) if datas else np.array([], dtype='datetime64[D]')
+
+
+def holiday_flags(datas, estaduais=False):
+    """Indica (True/False) se cada data é feriado."""
+    dias = pd.DatetimeIndex(datas).to_numpy(dtype='datetime64[D]')
+    if len(dias) == 0:
+        return np.zeros(0, dtype=bool)
+    anos = dias.astype('datetime64[Y]').astype(np.int64) + 1970
+    return np.isin(dias, holiday_dates(anos, estaduais))
+
+
+def add_calendar_features(df, coluna='data_hora', estaduais=False):
+    """
+    Adiciona ao DataFrame as colunas de calendário derivadas da coluna de data:
+    ano, mes, dia, dia_da_semana (0: segunda-feira), estacao, estacao_cos, estacao_sin e feriado
+    (feriados nacionais; com estaduais=True, também os do RS).
+    """
+    datas = pd.DatetimeIndex(df[coluna])
+    codigos = season_codes(datas)
+
+    df['ano'] = datas.year.to_numpy()
+    df['mes'] = datas.month.to_numpy(dtype=np.int8)
+    df['dia'] = datas.day.to_numpy(dtype=np.int8)
+    df['dia_da_semana'] = datas.dayofweek.to_numpy(dtype=np.int8)
+    df['estacao'] = pd.Categorical.from_codes(codigos, categories=SEASONS, ordered=True)
+    df['estacao_cos'] = SEASON_COS[codigos]
+    df['estacao_sin'] = SEASON_SIN[codigos]
+    df['feriado'] = holiday_flags(datas, estaduais)
+    return df
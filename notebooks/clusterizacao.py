@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import DBSCAN, OPTICS, MiniBatchKMeans, cluster_optics_xi
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score
+from sklearn.neighbors import NearestNeighbors
+
+from avaliacao import sampled_silhouette
+from codificacao import model_input
+
+
+# Linhas lidas do DataFrame por vez nos modos em streaming e tamanho de cada mini-batch do K-means
+STREAM_CHUNK_SIZE = 100_000
+MINI_BATCH_SIZE = 4096
+
+
+def radius_graph(X, raio, n_jobs=-1):
+    """Grafo esparso (CSR) com a distância entre todos os pares de pontos a no máximo raio um do outro."""
+    vizinhos = NearestNeighbors(radius=raio, n_jobs=n_jobs).fit(X)
+    return vizinhos.radius_neighbors_graph(mode='distance', sort_results=True)
+
+
+def restrict_graph(grafo, eps):
+    """Mantém apenas as arestas com distância <= eps (distâncias zero, de pontos repetidos, são preservadas)."""
+    coo = grafo.tocoo()
+    manter = coo.data <= eps
+    return sparse.csr_matrix((coo.data[manter], (coo.row[manter], coo.col[manter])), shape=grafo.shape)
+
+
+def k_distance_curve(X, k, n_jobs=-1):
+    """Distância de cada ponto ao seu k-ésimo vizinho mais próximo, em ordem crescente (gráfico k-distance)."""
+    distancias, _ = NearestNeighbors(n_neighbors=k, n_jobs=n_jobs).fit(X).kneighbors(X)
+    return np.sort(distancias[:, -1])
+
+
+def knee_point(curva):
+    """
+    Joelho de uma curva crescente: o ponto mais distante da reta que liga o primeiro ao último ponto
+    (com os dois eixos normalizados entre 0 e 1). Retorna a posição e o valor do joelho.
+    """
+    y = np.asarray(curva, dtype=np.float64)
+    x = np.linspace(0, 1, len(y))
+    amplitude = y[-1] - y[0]
+    y_norm = (y - y[0]) / amplitude if amplitude > 0 else np.zeros_like(y)
+    posicao = int(np.argmax(x - y_norm))
+    return posicao, y[posicao]
+
+
+def suggest_eps(X, min_samples, n_jobs=-1):
+    """Sugestão de eps para o DBSCAN pelo joelho do gráfico k-distance, com k = min_samples."""
+    curva = k_distance_curve(X, min_samples, n_jobs)
+    _, eps = knee_point(curva)
+    return eps, curva
+
+
+def dbscan_sweep(X, eps_values, min_samples_values, n_amostras_silhueta=10_000, n_jobs=-1, random_state=42):
+    """
+    Testa todas as combinações de eps e min_samples do DBSCAN com uma única busca de vizinhos:
+    o grafo de vizinhança é construído uma vez com o maior eps e, para cada eps menor, é apenas filtrado;
+    o DBSCAN então roda sobre o grafo pré-calculado (metric='precomputed'), sem nova busca de vizinhos.
+    Cada resultado é avaliado com a silhueta amostrada (ruídos contam como um grupo, como no notebook),
+    o Davies-Bouldin Index e o Calinski-Harabasz Index. Retorna a tabela de resultados e os rótulos da combinação com maior silhueta.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    grafo = radius_graph(X, max(eps_values), n_jobs)
+
+    resultados = []
+    melhores_rotulos, melhor_silhueta = None, -np.inf
+    ## Do maior para o menor eps, cada grafo é filtrado a partir do anterior (que já é menor)
+    for eps in sorted(eps_values, reverse=True):
+        grafo = restrict_graph(grafo, eps)
+        for min_samples in min_samples_values:
+            rotulos = DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed', n_jobs=n_jobs).fit_predict(grafo)
+
+            linha = {
+                'eps': eps,
+                'min_samples': min_samples,
+                'n_clusters': len(np.unique(rotulos[rotulos >= 0])),
+                'ruido': np.mean(rotulos == -1),
+                'silhueta': np.nan,
+                'ic_inferior': np.nan,
+                'ic_superior': np.nan,
+                'davies_bouldin': np.nan,
+                'calinski_harabasz': np.nan,
+            }
+            if len(np.unique(rotulos)) > 1:
+                silhueta = sampled_silhouette(X, rotulos, n_amostras=n_amostras_silhueta, random_state=random_state)
+                linha.update({
+                    'silhueta': silhueta['silhueta'],
+                    'ic_inferior': silhueta['ic_inferior'],
+                    'ic_superior': silhueta['ic_superior'],
+                    'davies_bouldin': davies_bouldin_score(X, rotulos),
+                    'calinski_harabasz': calinski_harabasz_score(X, rotulos),
+                })
+                if silhueta['silhueta'] > melhor_silhueta:
+                    melhor_silhueta, melhores_rotulos = silhueta['silhueta'], rotulos
+            resultados.append(linha)
+
+    resultados = pd.DataFrame(resultados).sort_values('silhueta', ascending=False).reset_index(drop=True)
+    return resultados, melhores_rotulos
+
+
+def optics_labels(modelo, xi, min_cluster_size):
+    """
+    Rótulos do OPTICS para outros xi e min_cluster_size a partir da ordenação e das distâncias de
+    alcançabilidade de um modelo já treinado (apenas a etapa de extração, sem novo fit).
+    """
+    rotulos, _ = cluster_optics_xi(
+        reachability=modelo.reachability_,
+        predecessor=modelo.predecessor_,
+        ordering=modelo.ordering_,
+        min_samples=modelo.min_samples,
+        min_cluster_size=min_cluster_size,
+        xi=xi,
+        predecessor_correction=modelo.predecessor_correction,
+    )
+    return rotulos
+
+
+def optics_sweep(X, min_samples_values, xi_values, min_cluster_size_values, n_jobs=-1, **kwargs):
+    """
+    Testa todas as combinações de min_samples, xi e min_cluster_size do OPTICS treinando apenas um modelo por
+    min_samples: somente ele altera a ordenação e a alcançabilidade, enquanto xi e min_cluster_size mudam apenas
+    a extração dos clusters (cluster_optics_xi), refeita sobre o modelo guardado. Cada resultado é avaliado
+    pelo Davies-Bouldin Index (menor é melhor). Retorna a tabela de resultados e os modelos por min_samples.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    modelos = {}
+    resultados = []
+    for min_samples in min_samples_values:
+        modelos[min_samples] = modelo = OPTICS(min_samples=min_samples, n_jobs=n_jobs, **kwargs).fit(X)
+        for xi in xi_values:
+            for min_cluster_size in min_cluster_size_values:
+                rotulos = optics_labels(modelo, xi, min_cluster_size)
+                unicos = np.unique(rotulos)
+                resultados.append({
+                    'min_samples': min_samples,
+                    'xi': xi,
+                    'min_cluster_size': min_cluster_size,
+                    'n_clusters': np.sum(unicos >= 0),
+                    'ruido': np.mean(rotulos == -1),
+                    'davies_bouldin': davies_bouldin_score(X, rotulos) if len(unicos) > 1 else np.nan,
+                })
+
+    resultados = pd.DataFrame(resultados).sort_values('davies_bouldin').reset_index(drop=True)
+    return resultados, modelos
+
+
+def iter_chunks(df, colunas, tamanho_bloco=STREAM_CHUNK_SIZE, ordem=None):
+    """
+    Percorre o DataFrame em blocos de tamanho_bloco linhas, devolvendo a matriz float64 das colunas de cada bloco
+    (colunas One Hot são geradas por model_input apenas para o bloco). ordem define a sequência dos blocos.
+    """
+    inicios = np.arange(0, len(df), tamanho_bloco)
+    if ordem is not None:
+        inicios = inicios[ordem]
+    for inicio in inicios:
+        yield inicio, model_input(df.iloc[inicio:inicio + tamanho_bloco], colunas).to_numpy(dtype=np.float64)
+
+
+def streaming_kmeans(df, colunas, n_clusters, init='k-means++', tamanho_bloco=STREAM_CHUNK_SIZE,
+                     batch_size=MINI_BATCH_SIZE, n_passadas=1, random_state=42):
+    """
+    K-means em mini-batches treinado sobre o DataFrame inteiro, sem carregar todas as colunas de entrada na memória.
+    O DataFrame é lido em blocos de tamanho_bloco linhas e cada bloco é embaralhado e dividido em mini-batches de
+    batch_size linhas, cada um com uma atualização dos centróides (partial_fit). Os blocos são visitados em ordem
+    aleatória a cada passada, pois o DataFrame está ordenado por instalação; as linhas que sobram de um bloco são
+    somadas ao seguinte, e as últimas da passada formam um mini-batch menor. init pode receber centróides
+    iniciais (warm start).
+    """
+    rng = np.random.default_rng(random_state)
+    modelo = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        init=init,
+        n_init=1,
+        batch_size=batch_size,
+        random_state=random_state,
+    )
+    n_blocos = int(np.ceil(len(df) / tamanho_bloco))
+    inicializado = False
+    for _ in range(n_passadas):
+        pendente = np.empty((0, len(colunas)))
+        for _, bloco in iter_chunks(df, colunas, tamanho_bloco, ordem=rng.permutation(n_blocos)):
+            linhas = np.concatenate([pendente, bloco[rng.permutation(len(bloco))]])
+            n_completos = len(linhas) // batch_size * batch_size
+            for inicio in range(0, n_completos, batch_size):
+                modelo.partial_fit(linhas[inicio:inicio + batch_size])
+                inicializado = True
+            pendente = linhas[n_completos:]
+
+        ## O primeiro partial_fit precisa de pelo menos n_clusters linhas para inicializar os centróides
+        if len(pendente) > 0 and (inicializado or len(pendente) >= n_clusters):
+            modelo.partial_fit(pendente)
+            inicializado = True
+
+    if not inicializado:
+        raise ValueError(f"O DataFrame tem {len(df)} linhas, menos que os {n_clusters} clusters pedidos.")
+    return modelo
+
+
+def assign_clusters(modelo, df, colunas, tamanho_bloco=STREAM_CHUNK_SIZE):
+    """
+    Cluster e distância ao centróide mais próximo de todas as linhas, calculados bloco a bloco.
+    Retorna os arrays cluster (int32) e distance_to_centroid (float32) e a inércia total da base.
+    """
+    clusters = np.empty(len(df), dtype=np.int32)
+    distancias = np.empty(len(df), dtype=np.float32)
+    inercia = 0.0
+    for inicio, bloco in iter_chunks(df, colunas, tamanho_bloco):
+        distancias_bloco = modelo.transform(bloco)
+        fim = inicio + len(bloco)
+        clusters[inicio:fim] = distancias_bloco.argmin(axis=1)
+        distancias[inicio:fim] = distancias_bloco.min(axis=1)
+        inercia += np.sum(distancias[inicio:fim].astype(np.float64) ** 2)
+    return clusters, distancias, inercia
+
+
+def _add_centroid(modelo, df, colunas, tamanho_bloco, rng):
+    """
+    Centróides do modelo com um centróide a mais, sorteado em um bloco aleatório com probabilidade proporcional
+    ao quadrado da distância ao centróide mais próximo (mesma regra do k-means++).
+    """
+    inicio = rng.integers(0, max(len(df) - tamanho_bloco, 0) + 1)
+    bloco = model_input(df.iloc[inicio:inicio + tamanho_bloco], colunas).to_numpy(dtype=np.float64)
+    pesos = modelo.transform(bloco).min(axis=1) ** 2
+    novo = bloco[rng.choice(len(bloco), p=pesos / pesos.sum())] if pesos.sum() > 0 else bloco[rng.integers(len(bloco))]
+    return np.vstack([modelo.cluster_centers_, novo])
+
+
+def streaming_elbow(df, colunas, K_range=range(1, 11), tamanho_bloco=STREAM_CHUNK_SIZE, batch_size=MINI_BATCH_SIZE,
+                    n_passadas=1, random_state=42):
+    """
+    Inércia do K-means em mini-batches para cada K, sobre o DataFrame inteiro, para o gráfico do cotovelo.
+    Cada K parte dos centróides do K anterior mais um novo centróide (warm start), o que reduz as iterações
+    necessárias; a inércia é calculada sobre todas as linhas. Retorna a tabela (K, inercia) e os modelos.
+    """
+    rng = np.random.default_rng(random_state)
+    resultados, modelos = [], {}
+    anterior = None
+    for K in sorted(K_range):
+        if anterior is not None and anterior.n_clusters == K - 1:
+            init = _add_centroid(anterior, df, colunas, tamanho_bloco, rng)
+        else:
+            init = 'k-means++'
+        modelo = streaming_kmeans(df, colunas, K, init=init, tamanho_bloco=tamanho_bloco, batch_size=batch_size,
+                                  n_passadas=n_passadas, random_state=random_state)
+        _, _, inercia = assign_clusters(modelo, df, colunas, tamanho_bloco)
+        resultados.append({'K': K, 'inercia': inercia})
+        modelos[K] = anterior = modelo
+    return pd.DataFrame(resultados), modelos
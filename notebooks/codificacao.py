@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+
+# Colunas categóricas mantidas como pandas.Categorical (códigos int8) ao longo do pré-processamento.
+# As colunas One Hot '<coluna>_<categoria>' só são criadas, em uint8, na entrada dos modelos.
+CATEGORICAL_FEATURES = ['model', 'situacao', 'perfil_consumo', 'cidade', 'categoria']
+
+
+def to_categorical(df, colunas=CATEGORICAL_FEATURES):
+    """Converte as colunas presentes no DataFrame para o tipo category."""
+    for coluna in colunas:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+
+def fill_categorical(df, valores):
+    """
+    Preenche os valores faltantes de cada coluna categórica com o valor indicado
+    (por exemplo, as linhas sem correspondência após o merge com a tabela de cadastro).
+    """
+    for coluna, valor in valores.items():
+        if valor not in df[coluna].cat.categories:
+            df[coluna] = df[coluna].cat.add_categories([valor])
+        df[coluna] = df[coluna].fillna(valor)
+    return df
+
+
+def map_categories(serie, funcao):
+    """
+    Aplica a função a cada categoria (e não a cada linha) e recodifica a coluna.
+    Categorias que passam a ter o mesmo nome (por exemplo, com e sem acento) são unificadas.
+    """
+    serie = serie.astype('category')
+    novos_nomes = [funcao(categoria) for categoria in serie.cat.categories]
+    categorias = list(dict.fromkeys(novos_nomes))
+
+    posicao = {categoria: i for i, categoria in enumerate(categorias)}
+    tabela = np.array([posicao[nome] for nome in novos_nomes] + [-1])
+
+    ## O código -1 (NaN) é mapeado para a última posição da tabela, que também vale -1
+    codigos = tabela[serie.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=categorias), index=serie.index, name=serie.name)
+
+
+def one_hot_names(df, coluna):
+    """Nomes das colunas One Hot de uma coluna categórica, no mesmo formato do pd.get_dummies."""
+    return [f'{coluna}_{categoria}' for categoria in df[coluna].cat.categories]
+
+
+def one_hot_matrix(df, coluna, categorias=None):
+    """
+    Cria a matriz One Hot (uint8) de uma coluna categórica diretamente a partir dos códigos.
+    Se categorias for informado, apenas essas colunas são criadas, nessa ordem.
+    """
+    serie = df[coluna]
+    if categorias is None:
+        categorias = list(serie.cat.categories)
+
+    indice = {categoria: i for i, categoria in enumerate(serie.cat.categories)}
+    colunas = np.array([indice.get(categoria, -2) for categoria in categorias])
+
+    return (serie.cat.codes.to_numpy()[:, None] == colunas[None, :]).astype(np.uint8)
+
+
+def model_input(df, colunas, categoricas=CATEGORICAL_FEATURES):
+    """
+    Monta o DataFrame de entrada dos modelos com as colunas pedidas, na ordem pedida.
+    Colunas no formato '<coluna>_<categoria>' de uma coluna categórica são geradas como One Hot (uint8)
+    apenas neste momento; as demais são copiadas do DataFrame.
+    """
+    pedidas_por_coluna = {}
+    for nome in colunas:
+        if nome in df.columns:
+            continue
+        for coluna in categoricas:
+            if coluna in df.columns and nome.startswith(f'{coluna}_'):
+                pedidas_por_coluna.setdefault(coluna, []).append(nome)
+                break
+        else:
+            raise ValueError(f"A coluna {nome} não está no DataFrame e não corresponde a nenhuma coluna categórica.")
+
+    dados = {}
+    for coluna, nomes in pedidas_por_coluna.items():
+        categorias = [nome[len(coluna) + 1:] for nome in nomes]
+        matriz = one_hot_matrix(df, coluna, categorias)
+        for i, nome in enumerate(nomes):
+            dados[nome] = matriz[:, i]
+
+    return pd.DataFrame({
+        nome: dados[nome] if nome in dados else df[nome].to_numpy()
+        for nome in colunas
+    }, index=df.index)
+
+
+def decode_one_hot(df, prefixo, categorias):
+    """
+    Reconstrói uma coluna categórica a partir das colunas One Hot '<prefixo>_<categoria>'.
+    A categoria de cada linha é a da primeira coluna verdadeira (argmax sobre o bloco One Hot);
+    linhas sem nenhuma coluna verdadeira ficam como NaN.
+    """
+    categorias = list(categorias)
+    bloco = df[[f'{prefixo}_{categoria}' for categoria in categorias]].to_numpy(dtype=bool)
+
+    codigos = bloco.argmax(axis=1)
+    codigos[~bloco.any(axis=1)] = -1
+
+    return pd.Categorical.from_codes(codigos, categories=categorias)
@@ -0,0 +1,211 @@
+"""
+Coleta das temperaturas históricas (API da Weatherbit) de várias cidades e meses em paralelo.
+
+Uso:
+    API_KEY=... python coleta_temperaturas.py --inicio 2024-02 --fim 2024-06 --saida temperaturas_diarias.csv
+
+As requisições são feitas de forma assíncrona, com um número máximo de conexões simultâneas, limite de
+requisições por segundo do provedor e novas tentativas com espera exponencial. Cada resposta é guardada em
+disco por (lat, lon, mês), de forma que meses já baixados não são buscados novamente. A saída é a tabela
+de temperatura média diária (cidade, data, temp) aceita por temperatura.TemperatureStore.from_frame.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pandas as pd
+
+
+# Coordenadas das cidades presentes nos dados de consumo
+CITY_COORDINATES = {
+    'canoas': (-29.91288005916852, -51.183972626036535),
+    'gravatai': (-29.9440, -50.9919),
+    'novo_hamburgo': (-29.6783, -51.1309),
+    'porto_alegre': (-30.0346, -51.2177),
+    'sao_leopoldo': (-29.7604, -51.1472),
+}
+
+RESPONSE_CACHE_DIR = '../data_inteli/cache_weatherbit'
+MAX_CONNECTIONS = 8
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class WeatherbitProvider:
+    """Monta as URLs da API de histórico sub-horário da Weatherbit e lê as temperaturas da resposta."""
+
+    nome = 'weatherbit'
+
+    def __init__(self, api_key, base_url='https://api.weatherbit.io/v2.0', requisicoes_por_segundo=1.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.requisicoes_por_segundo = requisicoes_por_segundo
+
+    def url(self, lat, lon, inicio, fim):
+        parametros = urllib.parse.urlencode({
+            'lat': lat, 'lon': lon,
+            'start_date': inicio.strftime('%Y-%m-%d'), 'end_date': fim.strftime('%Y-%m-%d'),
+            'key': self.api_key,
+        })
+        return f'{self.base_url}/history/subhourly?{parametros}'
+
+    def records(self, payload):
+        """Lista de (data local, temperatura) de cada medição da resposta."""
+        return [(entrada['timestamp_local'][:10], entrada['temp']) for entrada in payload.get('data', [])]
+
+
+class RateLimiter:
+    """Limita as requisições a um provedor a uma taxa fixa (requisições por segundo), entre todas as tarefas."""
+
+    def __init__(self, taxa):
+        self.intervalo = 1.0 / taxa if taxa else 0.0
+        self._proxima = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+
+class ResponseCache:
+    """Respostas da API guardadas em disco, uma por (provedor, lat, lon, mês)."""
+
+    def __init__(self, cache_dir=RESPONSE_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def path(self, provedor, lat, lon, mes):
+        chave = f'{provedor}_{lat:.4f}_{lon:.4f}_{mes}'
+        nome = hashlib.sha1(chave.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, provedor, f'{mes}_{nome}.json')
+
+    def get(self, provedor, lat, lon, mes):
+        path = self.path(provedor, lat, lon, mes)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+
+    def put(self, provedor, lat, lon, mes, payload):
+        path = self.path(provedor, lat, lon, mes)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ## Escreve em um arquivo temporário e troca, para não deixar respostas pela metade no cache
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as arquivo:
+            json.dump(payload, arquivo)
+        os.replace(tmp_path, path)
+
+
+def month_ranges(inicio, fim):
+    """Pares (mês 'AAAA-MM', primeiro dia, primeiro dia do mês seguinte) de inicio até fim, inclusive."""
+    meses = pd.period_range(pd.Period(inicio, 'M'), pd.Period(fim, 'M'), freq='M')
+    return [(str(mes), mes.start_time, (mes + 1).start_time) for mes in meses]
+
+
+def _get_json(url, timeout):
+    with urllib.request.urlopen(url, timeout=timeout) as resposta:
+        return json.loads(resposta.read().decode('utf-8'))
+
+
+async def fetch_month(provedor, cache, limitador, conexoes, lat, lon, mes, inicio, fim,
+                      max_tentativas=MAX_RETRIES, backoff=BACKOFF_SECONDS, timeout=30):
+    """
+    Busca um mês de uma coordenada, usando o cache quando possível.
+    Erros de rede e respostas 429/5xx são repetidos com espera exponencial (respeitando o Retry-After).
+    """
+    payload = cache.get(provedor.nome, lat, lon, mes)
+    if payload is not None:
+        return payload
+
+    url = provedor.url(lat, lon, inicio, fim)
+    for tentativa in range(max_tentativas):
+        espera = backoff * 2 ** tentativa + random.uniform(0, backoff)
+        try:
+            await limitador.acquire()
+            async with conexoes:
+                payload = await asyncio.to_thread(_get_json, url, timeout)
+            cache.put(provedor.nome, lat, lon, mes, payload)
+            return payload
+
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUS or tentativa == max_tentativas - 1:
+                raise
+            retry_after = e.headers.get('Retry-After') if e.headers else None
+            if retry_after and retry_after.isdigit():
+                espera = max(espera, float(retry_after))
+
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            if tentativa == max_tentativas - 1:
+                raise
+
+        print(f"Nova tentativa para {mes} ({lat}, {lon}) em {espera:.1f}s")
+        await asyncio.sleep(espera)
+
+
+async def fetch_all(provedor, cidades, inicio, fim, cache_dir=RESPONSE_CACHE_DIR, max_conexoes=MAX_CONNECTIONS, **kwargs):
+    """Busca todos os meses de todas as cidades em paralelo e retorna {(cidade, mês): resposta}."""
+    cache = ResponseCache(cache_dir)
+    limitador = RateLimiter(provedor.requisicoes_por_segundo)
+    conexoes = asyncio.Semaphore(max_conexoes)
+
+    tarefas = {
+        (cidade, mes): fetch_month(provedor, cache, limitador, conexoes, lat, lon, mes, mes_inicio, mes_fim, **kwargs)
+        for cidade, (lat, lon) in cidades.items()
+        for mes, mes_inicio, mes_fim in month_ranges(inicio, fim)
+    }
+    respostas = await asyncio.gather(*tarefas.values(), return_exceptions=True)
+    return dict(zip(tarefas.keys(), respostas))
+
+
+def daily_average_table(provedor, respostas):
+    """Tabela (cidade, data, temp) com a temperatura média de cada dia, como nos CSVs diários originais."""
+    linhas = []
+    for (cidade, mes), payload in respostas.items():
+        if isinstance(payload, Exception):
+            print(f"Falha ao buscar {cidade} em {mes}: {payload}")
+            continue
+        linhas.extend((cidade, data, temp) for data, temp in provedor.records(payload))
+
+    df = pd.DataFrame(linhas, columns=['cidade', 'data', 'temp'])
+    df['data'] = pd.to_datetime(df['data'])
+    return df.groupby(['cidade', 'data'], as_index=False)['temp'].mean().round({'temp': 2})
+
+
+def fetch_daily_temperatures(provedor, cidades=CITY_COORDINATES, inicio='2024-02', fim='2024-06', **kwargs):
+    """Versão síncrona: busca as temperaturas e retorna a tabela de médias diárias."""
+    respostas = asyncio.run(fetch_all(provedor, cidades, inicio, fim, **kwargs))
+    return daily_average_table(provedor, respostas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coleta de temperaturas médias diárias por cidade.')
+    parser.add_argument('--inicio', default='2024-02', help='Primeiro mês (AAAA-MM)')
+    parser.add_argument('--fim', default='2024-06', help='Último mês (AAAA-MM)')
+    parser.add_argument('--saida', default='temperaturas_diarias.csv', help='CSV com as médias diárias')
+    parser.add_argument('--cache', default=RESPONSE_CACHE_DIR, help='Pasta do cache de respostas')
+    parser.add_argument('--conexoes', type=int, default=MAX_CONNECTIONS, help='Conexões simultâneas')
+    parser.add_argument('--taxa', type=float, default=1.0, help='Requisições por segundo permitidas pelo provedor')
+    parser.add_argument('--base-url', default='https://api.weatherbit.io/v2.0', help='URL da API (ex.: servidor local de testes)')
+    args = parser.parse_args()
+
+    provedor = WeatherbitProvider(os.getenv('API_KEY'), base_url=args.base_url, requisicoes_por_segundo=args.taxa)
+
+    inicio = time.time()
+    df = fetch_daily_temperatures(provedor, inicio=args.inicio, fim=args.fim, cache_dir=args.cache, max_conexoes=args.conexoes)
+    df.to_csv(args.saida, index=False)
+    print(f"{len(df)} médias diárias salvas em {args.saida} em {time.time() - inicio:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+
+DATA_DIR = '../data_inteli'
+PARQUET_DIR = os.path.join(DATA_DIR, 'parquet')
+
+MONTH_FILES = ['month_2.csv', 'month_3.csv', 'month_4.csv', 'month_5.csv', 'month_6.csv']
+
+# Tipos das colunas dos arquivos mensais de consumo
+CATEGORICAL_COLUMNS = ['clientCode', 'inputType', 'model']
+DATETIME_COLUMNS = ['datetime']
+CONSUMO_DTYPES = {
+    'clientCode': 'category',
+    'clientIndex': 'int16',
+    'inputType': 'category',
+    'model': 'category',
+    ## Leituras acumuladas do medidor ficam em float64 (em float32 perdem precisão a partir de ~7 dígitos),
+    ## assim como pulseCount e gain, cujo produto é o consumo acumulado em m^3
+    'meterIndex': 'float64',
+    'initialIndex': 'float64',
+    'pulseCount': 'float64',
+    'gain': 'float64',
+    'rssi': 'float32',
+    'gatewayGeoLocation.alt': 'float32',
+    'gatewayGeoLocation.lat': 'float32',
+    'gatewayGeoLocation.long': 'float32',
+}
+
+
+def parquet_path_for(csv_path, parquet_dir=PARQUET_DIR):
+    nome = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(parquet_dir, f'{nome}.parquet')
+
+
+def convert_csv_to_parquet(csv_path, parquet_path=None, dtypes=CONSUMO_DTYPES, compression='zstd'):
+    """
+    Lê um CSV mensal uma única vez com os tipos definidos (categorias, datetime64 e float32)
+    e salva em Parquet comprimido.
+    """
+    if parquet_path is None:
+        parquet_path = parquet_path_for(csv_path)
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+
+    colunas = pd.read_csv(csv_path, nrows=0).columns
+    df = pd.read_csv(csv_path, dtype={col: tipo for col, tipo in dtypes.items() if col in colunas})
+    for col in DATETIME_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+
+    df.to_parquet(parquet_path, compression=compression, index=False)
+    return parquet_path
+
+
+def _schema_outdated(parquet_path, dtypes=CONSUMO_DTYPES):
+    """Indica se alguma coluna numérica do Parquet foi salva com um tipo diferente do definido em dtypes."""
+    schema = pq.read_schema(parquet_path)
+    for coluna, tipo in dtypes.items():
+        if tipo != 'category' and coluna in schema.names and np.dtype(schema.field(coluna).type.to_pandas_dtype()) != np.dtype(tipo):
+            return True
+    return False
+
+
+def ensure_parquet(csv_path, parquet_dir=PARQUET_DIR):
+    """Converte o CSV para Parquet apenas se o Parquet não existir, estiver desatualizado ou com outros tipos."""
+    parquet_path = parquet_path_for(csv_path, parquet_dir)
+    if (not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(csv_path)
+            or _schema_outdated(parquet_path)):
+        print(f"Convertendo {csv_path} para {parquet_path}")
+        convert_csv_to_parquet(csv_path, parquet_path)
+    return parquet_path
+
+
+def ensure_parquet_cache(arquivos=MONTH_FILES, data_dir=DATA_DIR, parquet_dir=PARQUET_DIR):
+    """Garante que todos os meses estejam convertidos e retorna os caminhos dos arquivos Parquet."""
+    return [ensure_parquet(os.path.join(data_dir, arquivo), parquet_dir) for arquivo in arquivos]
+
+
+def load_parquet(parquet_path, columns=None):
+    """Lê apenas as colunas pedidas de um Parquet, com leitura mapeada em memória."""
+    df = pd.read_parquet(parquet_path, columns=columns, memory_map=True)
+    for col in DATETIME_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].dt.as_unit('ns')
+    return df
+
+
+def concat_with_categories(dfs):
+    """Concatena DataFrames mantendo as colunas categóricas (unindo as categorias de cada mês)."""
+    dfs = list(dfs)
+    df = pd.concat(dfs, ignore_index=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and all(isinstance(parte[col].dtype, pd.CategoricalDtype) for parte in dfs):
+            df[col] = union_categoricals([parte[col] for parte in dfs])
+    return df
+
+
+def load_months(parquet_paths=None, columns=None):
+    """Carrega e concatena os meses a partir do cache Parquet (convertendo os CSVs se necessário)."""
+    if parquet_paths is None:
+        parquet_paths = ensure_parquet_cache()
+    return concat_with_categories(load_parquet(path, columns) for path in parquet_paths)
+
+
+# Modo incremental: partições processadas por mês e estado da última leitura de cada instalação
+PROCESSED_DIR = os.path.join(DATA_DIR, 'processado')
+STATE_PATH = os.path.join(PROCESSED_DIR, 'estado_instalacoes.parquet')
+INSTALLATION_KEYS = ['clientCode', 'clientIndex']
+## Apenas o necessário para o diff da primeira leitura do mês seguinte (consumo e intervalo de tempo)
+STATE_COLUMNS = INSTALLATION_KEYS + ['datetime', 'consumo em m^3']
+
+
+def clean_month(df):
+    """Aplica a um mês as mesmas limpezas da seção 4.2 que afetam o cálculo do consumo."""
+    df = df.drop(columns=['gatewayGeoLocation.alt', 'gatewayGeoLocation.lat', 'gatewayGeoLocation.long', 'rssi'], errors='ignore')
+    df.loc[df['model'] == 'Infinity V2', 'gain'] = 1
+    df[['gain', 'pulseCount', 'meterIndex']] = df[['gain', 'pulseCount', 'meterIndex']].fillna(0)
+    return df
+
+
+def compute_consumption_features(df, estado=None):
+    """
+    Calcula 'consumo em m^3', 'variação_consumo', 'delta_time' (em horas) e 'consumo_horarizado' de um mês.
+    A primeira leitura de cada instalação é comparada com a última leitura do estado anterior,
+    para que os valores na virada do mês sejam os mesmos do processamento de todo o histórico.
+    """
+    df = df.copy()
+    df['consumo em m^3'] = df['gain'].astype('float64') * df['pulseCount'].astype('float64')
+    df['_estado'] = False
+
+    if estado is not None and len(estado) > 0:
+        anteriores = estado[STATE_COLUMNS].copy()
+        anteriores['_estado'] = True
+        df = pd.concat([anteriores, df], ignore_index=True)
+
+    df = df.sort_values(INSTALLATION_KEYS + ['datetime', '_estado'], ascending=[True, True, True, False], kind='mergesort')
+
+    grupos = df.groupby(INSTALLATION_KEYS, sort=False, observed=True)
+    df['variação_consumo'] = grupos['consumo em m^3'].diff().fillna(0)
+    df['delta_time'] = (grupos['datetime'].diff().dt.total_seconds() / 3600).fillna(0)
+
+    df['consumo_horarizado'] = df['variação_consumo'] / df['delta_time']
+    df['consumo_horarizado'] = df['consumo_horarizado'].replace([float('inf'), -float('inf')], 0).fillna(0)
+
+    df = df[~df['_estado']].drop(columns='_estado')
+    return df.reset_index(drop=True)
+
+
+def update_state(estado, df_mes):
+    """Atualiza o estado com a última leitura de cada instalação presente no mês processado."""
+    ultimas = df_mes.sort_values('datetime').groupby(INSTALLATION_KEYS, observed=True).tail(1)[STATE_COLUMNS]
+    if estado is None or len(estado) == 0:
+        return ultimas.reset_index(drop=True)
+    estado = pd.concat([estado[STATE_COLUMNS], ultimas], ignore_index=True)
+    return estado.drop_duplicates(subset=INSTALLATION_KEYS, keep='last').reset_index(drop=True)
+
+
+def load_state(state_path=STATE_PATH):
+    if not os.path.exists(state_path):
+        return None
+    estado = load_parquet(state_path)
+    estado['clientCode'] = estado['clientCode'].astype(str)
+    return estado
+
+
+def process_new_months(arquivos=MONTH_FILES, data_dir=DATA_DIR, processed_dir=PROCESSED_DIR, state_path=STATE_PATH):
+    """
+    Processa apenas os meses que ainda não possuem partição em processed_dir, em ordem cronológica,
+    levando o estado de cada instalação de um mês para o outro. Retorna os caminhos das partições.
+    """
+    os.makedirs(processed_dir, exist_ok=True)
+    estado = load_state(state_path)
+    particoes = []
+
+    for arquivo in arquivos:
+        particao = parquet_path_for(arquivo, processed_dir)
+        particoes.append(particao)
+        if os.path.exists(particao):
+            continue
+
+        print(f"Processando {arquivo} de forma incremental")
+        df_mes = clean_month(load_parquet(ensure_parquet(os.path.join(data_dir, arquivo))))
+        df_mes['clientCode'] = df_mes['clientCode'].astype(str)
+        df_mes = compute_consumption_features(df_mes, estado)
+
+        estado = update_state(estado, df_mes)
+        df_mes.to_parquet(particao, compression='zstd', index=False)
+        estado.to_parquet(state_path, compression='zstd', index=False)
+
+    return particoes
+
+
+def load_processed(particoes, columns=None):
+    """Carrega as partições já processadas, como se todo o histórico tivesse sido processado de uma vez."""
+    return concat_with_categories(load_parquet(path, columns) for path in particoes)
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+
+# Uma instalação é a combinação única de clientCode e clientIndex
+INSTALLATION_KEYS = ['clientCode', 'clientIndex']
+
+
+class InstallationIndex:
+    """
+    Índice das instalações de um DataFrame ordenado por instalação (e tempo).
+    Cada instalação tem um installation_id inteiro (int32, de 0 a n-1) e as suas linhas ocupam o bloco
+    contínuo [offsets[id], offsets[id + 1]), de forma que a série de uma instalação é obtida por
+    fatiamento, sem percorrer o DataFrame inteiro com uma máscara booleana.
+    """
+
+    def __init__(self, chaves, offsets):
+        self.chaves = chaves
+        self.offsets = offsets
+        self._ids = {tuple(linha): i for i, linha in enumerate(chaves.itertuples(index=False, name=None))}
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def installation_id(self, *chave):
+        """Retorna o installation_id da instalação (ex.: clientCode, clientIndex), ou None se não existir."""
+        return self._ids.get(tuple(chave))
+
+    def bounds(self, installation_id):
+        return int(self.offsets[installation_id]), int(self.offsets[installation_id + 1])
+
+    def slice(self, df, installation_id):
+        """Linhas da instalação no DataFrame ordenado devolvido por build_installation_index."""
+        inicio, fim = self.bounds(installation_id)
+        return df.iloc[inicio:fim]
+
+    def get(self, df, *chave):
+        installation_id = self.installation_id(*chave)
+        if installation_id is None:
+            return df.iloc[0:0]
+        return self.slice(df, installation_id)
+
+    def sizes(self):
+        """Quantidade de linhas de cada instalação."""
+        return np.diff(self.offsets)
+
+
+def assign_installation_ids(df, chaves=INSTALLATION_KEYS):
+    """Atribui um installation_id denso (int32), na ordem das chaves."""
+    return df.groupby(chaves, observed=True, sort=True).ngroup().to_numpy(dtype=np.int32)
+
+
+def build_installation_index(df, tempo='datetime', chaves=INSTALLATION_KEYS):
+    """
+    Atribui o installation_id e ordena o DataFrame uma única vez por instalação e tempo
+    (se tempo for None, a ordem original das linhas de cada instalação é mantida).
+    Retorna o DataFrame ordenado, com a coluna installation_id, e o InstallationIndex.
+    """
+    ids = assign_installation_ids(df, chaves)
+    if tempo is None:
+        ordem = np.argsort(ids, kind='stable')
+    else:
+        ordem = np.lexsort((df[tempo].to_numpy(), ids))
+
+    df = df.take(ordem).reset_index(drop=True)
+    df['installation_id'] = ids[ordem]
+
+    contagens = np.bincount(df['installation_id'].to_numpy(), minlength=ids.max() + 1 if len(ids) else 0)
+    offsets = np.concatenate([[0], np.cumsum(contagens)])
+
+    chaves_df = df.loc[offsets[:-1], chaves].reset_index(drop=True)
+    return df, InstallationIndex(chaves_df, offsets)
+
+
+def installation_starts(indice, n_linhas):
+    """Máscara booleana das linhas que iniciam o bloco de uma instalação (não possuem leitura anterior)."""
+    inicio = np.zeros(n_linhas, dtype=bool)
+    inicio[indice.offsets[:-1][indice.sizes() > 0]] = True
+    return inicio
+
+
+def _lag_diff(valores, inicio):
+    """Diferença para a linha anterior, com 0 na primeira linha de cada instalação (e onde houver NaN)."""
+    diferenca = np.empty(len(valores), dtype=np.float64)
+    diferenca[:1] = 0
+    np.subtract(valores[1:], valores[:-1], out=diferenca[1:])
+    diferenca[inicio | np.isnan(diferenca)] = 0
+    return diferenca
+
+
+def compute_lag_features(df, indice, consumo='consumo em m^3', tempo='datetime'):
+    """
+    Calcula, em uma única passada sobre o DataFrame ordenado por build_installation_index:
+    - variação_consumo: diferença do consumo para a leitura anterior da mesma instalação;
+    - delta_time: horas desde a leitura anterior da mesma instalação;
+    - consumo_horarizado: variação_consumo / delta_time (0 quando delta_time é 0).
+    As fronteiras entre instalações vêm dos offsets do índice, sem groupby nem nova ordenação.
+    """
+    inicio = installation_starts(indice, len(df))
+
+    variacao = _lag_diff(df[consumo].to_numpy(dtype=np.float64), inicio)
+    segundos = df[tempo].to_numpy().astype('datetime64[ns]').view(np.int64) / 1e9
+    delta = _lag_diff(segundos, inicio) / 3600
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        horarizado = variacao / delta
+    horarizado[~np.isfinite(horarizado)] = 0
+
+    df['variação_consumo'] = variacao
+    df['delta_time'] = delta
+    df['consumo_horarizado'] = horarizado
+    return df
+
+
+# Janelas (em linhas, ou seja, dias no dataset sintético) e estatísticas das médias móveis por instalação
+ROLLING_WINDOWS = [7, 30]
+ROLLING_STATS = {'mean': 'media_movel', 'std': 'desvio_movel', 'min': 'minimo_movel', 'max': 'maximo_movel'}
+
+
+def position_in_installation(indice, n_linhas):
+    """Posição de cada linha dentro do bloco da sua instalação (0 para a primeira leitura)."""
+    return np.arange(n_linhas) - np.repeat(indice.offsets[:-1], indice.sizes())
+
+
+def compute_rolling_features(df, indice, coluna='consumo_dia', janelas=ROLLING_WINDOWS, estatisticas=('mean',),
+                             ewm_spans=(), preencher=0):
+    """
+    Calcula janelas móveis da coluna por instalação sobre o DataFrame ordenado por build_installation_index.
+    Cada janela é calculada uma única vez sobre o array inteiro (os blocos das instalações são contíguos) e as
+    linhas cuja janela começaria na instalação anterior são descartadas pela posição dentro do bloco, de forma
+    que nenhuma janela mistura instalações. Cria as colunas '<estatística>_<janela>_dias' (ex.: media_movel_7_dias)
+    e 'ewma_<span>_dias'. Linhas sem uma janela completa recebem o valor de preencher.
+    """
+    serie = pd.Series(df[coluna].to_numpy(dtype=np.float64))
+    posicao = position_in_installation(indice, len(df))
+
+    for janela in janelas:
+        janela_movel = serie.rolling(window=janela)
+        incompleta = posicao < janela - 1
+        for estatistica in estatisticas:
+            valores = getattr(janela_movel, estatistica)().to_numpy()
+            valores[incompleta] = np.nan
+            df[f'{ROLLING_STATS[estatistica]}_{janela}_dias'] = valores
+
+    if ewm_spans:
+        ## A média exponencial recomeça em cada instalação (groupby().ewm() é calculado em Cython)
+        grupos = serie.groupby(df['installation_id'].to_numpy(), sort=False)
+        for span in ewm_spans:
+            df[f'ewma_{span}_dias'] = grupos.ewm(span=span).mean().to_numpy()
+
+    colunas = [f'{ROLLING_STATS[e]}_{j}_dias' for j in janelas for e in estatisticas]
+    if preencher is not None:
+        df[colunas] = df[colunas].fillna(preencher)
+    return df
+
+
+def compute_pct_change(df, indice, coluna='consumo_dia'):
+    """Mudança percentual para a leitura anterior da mesma instalação (NaN na primeira leitura de cada uma)."""
+    valores = df[coluna].to_numpy(dtype=np.float64)
+    anterior = np.empty_like(valores)
+    anterior[:1] = np.nan
+    anterior[1:] = valores[:-1]
+    anterior[installation_starts(indice, len(valores))] = np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return valores / anterior - 1
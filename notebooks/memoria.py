@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+
+# Colunas de texto repetidas que passam a ser categóricas
+CATEGORICAL_STRING_COLUMNS = ['clientCode', 'bairro']
+
+# Colunas que precisam continuar em float64: o timestamp em segundos, as leituras acumuladas do medidor e
+# pulseCount e gain (cujo produto é o consumo acumulado, calculado depois da redução de memória), além das
+# diferenças calculadas a partir delas, perdem precisão em float32, que guarda ~7 dígitos significativos
+FLOAT64_COLUMNS = [
+    'timestamp', 'meterIndex', 'initialIndex', 'pulseCount', 'gain',
+    'consumo em m^3', 'variação_consumo', 'consumo_horarizado',
+]
+
+# Colunas de texto com menos valores únicos que esta fração das linhas também viram categóricas
+MAX_CARDINALITY_FRACTION = 0.5
+
+INTEGER_TYPES = ['uint8', 'int8', 'int16', 'int32', 'int64']
+
+
+def memory_usage_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def _smallest_integer_type(serie):
+    minimo, maximo = serie.min(), serie.max()
+    for tipo in INTEGER_TYPES:
+        info = np.iinfo(tipo)
+        if info.min <= minimo and maximo <= info.max:
+            return tipo
+    return str(serie.dtype)
+
+
+def plan_dtypes(df, categoricas=CATEGORICAL_STRING_COLUMNS, float64=FLOAT64_COLUMNS,
+                max_cardinalidade=MAX_CARDINALITY_FRACTION):
+    """
+    Define o menor tipo de cada coluna:
+    - float64 -> float32, exceto as colunas em float64 (nas demais, valores com mais de ~7 dígitos
+      significativos são arredondados, o que é aceitável para medidas como temperatura e coordenadas);
+    - inteiros -> sem perda, o menor entre uint8, int8, int16 e int32 que comporta o mínimo e o máximo;
+    - texto repetido (colunas em categoricas ou com poucos valores únicos) -> category.
+    Retorna apenas as colunas cujo tipo muda.
+    """
+    plano = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_bool_dtype(serie) or isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+
+        if pd.api.types.is_float_dtype(serie):
+            if coluna not in float64 and serie.dtype != np.float32:
+                plano[coluna] = 'float32'
+        elif pd.api.types.is_integer_dtype(serie):
+            tipo = _smallest_integer_type(serie) if len(serie) else str(serie.dtype)
+            if tipo != str(serie.dtype):
+                plano[coluna] = tipo
+        elif pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie):
+            if coluna in categoricas or serie.nunique() < max_cardinalidade * len(serie):
+                plano[coluna] = 'category'
+
+    return plano
+
+
+def downcast(df, plano):
+    """Aplica o plano coluna a coluna, sem copiar o DataFrame inteiro."""
+    for coluna, tipo in plano.items():
+        df[coluna] = df[coluna].astype(tipo)
+    return df
+
+
+def memory_report(antes, depois):
+    """Tabela com o tipo e a memória (MB) de cada coluna antes e depois da otimização, e o total."""
+    relatorio = pd.DataFrame({
+        'dtype_antes': antes['dtypes'],
+        'dtype_depois': depois['dtypes'],
+        'mb_antes': antes['memoria'] / 1024 ** 2,
+        'mb_depois': depois['memoria'] / 1024 ** 2,
+    })
+    relatorio.loc['Total'] = ['', '', relatorio['mb_antes'].sum(), relatorio['mb_depois'].sum()]
+    relatorio['reducao_%'] = (1 - relatorio['mb_depois'] / relatorio['mb_antes']) * 100
+    return relatorio.round(2)
+
+
+def _snapshot(df):
+    return {'dtypes': df.dtypes.astype(str), 'memoria': df.memory_usage(deep=True, index=False)}
+
+
+def optimize_memory(df, orcamento_mb=None, **kwargs):
+    """
+    Reduz os tipos de dados do DataFrame e retorna (df, relatório antes/depois).
+    Se orcamento_mb for informado, indica se o DataFrame otimizado cabe no orçamento de memória.
+    """
+    antes = _snapshot(df)
+    df = downcast(df, plan_dtypes(df, **kwargs))
+    relatorio = memory_report(antes, _snapshot(df))
+
+    total = relatorio.loc['Total', 'mb_depois']
+    print(f"Memória: {relatorio.loc['Total', 'mb_antes']:.1f} MB -> {total:.1f} MB")
+    if orcamento_mb is not None:
+        situacao = 'cabe' if total <= orcamento_mb else 'NÃO cabe'
+        print(f"O DataFrame otimizado {situacao} no orçamento de {orcamento_mb} MB")
+
+    return df, relatorio
@@ -32,16 +32,15 @@ from sklearn.ensemble import IsolationForest
 from sklearn.metrics import davies_bouldin_score, silhouette_score, calinski_harabasz_score, make_scorer
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import GridSearchCV
+from sklearn.pipeline import Pipeline
 
 # %% [markdown]
-# Leitura de todos os arquivos CSV
+# Leitura de todos os arquivos CSV. Os arquivos mensais são convertidos uma única vez para Parquet (com os tipos já definidos) e, nas próximas execuções, são lidos diretamente do Parquet.
 
 # %%
-df_mes1 = pd.read_csv('../data_inteli/month_2.csv')
-df_mes2 = pd.read_csv('../data_inteli/month_3.csv')
-df_mes3 = pd.read_csv('../data_inteli/month_4.csv')
-df_mes4 = pd.read_csv('../data_inteli/month_5.csv')
-df_mes5 = pd.read_csv('../data_inteli/month_6.csv')
+from ingestao import ensure_parquet_cache, load_months
+
+arquivos_mensais = ensure_parquet_cache()
 df_cadastral = pd.read_csv('../data_inteli/informacao_cadastral.csv')
 
 # %% [markdown]
@@ -55,7 +54,7 @@ df_cadastral = pd.read_csv('../data_inteli/informacao_cadastral.csv')
 # Combinando as bases de dados mensais em um só DataFrame
 
 # %%
-df_combined = pd.concat([df_mes1, df_mes2, df_mes3, df_mes4, df_mes5], ignore_index=True)
+df_combined = load_months(arquivos_mensais)
 df_combined.info()
 
 # %% [markdown]
@@ -68,14 +67,14 @@ df_combined.dtypes
 # Variáveis categóricas
 
 # %%
-categorical_columns = df_combined.select_dtypes(include=['object']).columns
+categorical_columns = df_combined.select_dtypes(include=['object', 'category']).columns
 print(categorical_columns)
 
 # %% [markdown]
 # Variáveis numéricas
 
 # %%
-numerical_columns = df_combined.select_dtypes(include=['int64', 'float64']).columns
+numerical_columns = df_combined.select_dtypes(include=['number']).columns
 print(numerical_columns)
 
 # %% [markdown]
@@ -236,7 +235,7 @@ df_combined['datetime'] = pd.to_datetime(df_combined['datetime'])
 
 # Agrupando o consumo por cliente e por mês
 df_combined['month'] = df_combined['datetime'].dt.to_period('M')
-consumo_mensal = df_combined.groupby(['clientCode', 'month'])['meterIndex'].sum().reset_index()
+consumo_mensal = df_combined.groupby(['clientCode', 'month'], observed=True)['meterIndex'].sum().reset_index()
 
 # Filtrando por um cliente específico 
 cliente_especifico = consumo_mensal[consumo_mensal['clientCode'] == '7f8bffd14d76f3dcf3b4ad036d6df87354f8001d5d084fb94ca3ab39cf3be551']
@@ -324,7 +323,7 @@ plt.show()
 df_combined['datetime'] = pd.to_datetime(df_combined['datetime'])
 
 # Fazer o resampling (agrupamento por semana)
-df_resampled = df_combined.set_index('datetime').groupby('inputType').resample('W').size().unstack(fill_value=0)
+df_resampled = df_combined.set_index('datetime').groupby('inputType', observed=True).resample('W').size().unstack(fill_value=0)
 
 # Plotar o gráfico de linhas para cada inputType
 plt.figure(figsize=(14, 8))
@@ -519,18 +518,14 @@ dicionario
 # ### 4.1.3. Leitura de todos os arquivos CSV
 
 # %%
-df_mes1 = pd.read_csv('../data_inteli/month_2.csv')
-df_mes2 = pd.read_csv('../data_inteli/month_3.csv')
-df_mes3 = pd.read_csv('../data_inteli/month_4.csv')
-df_mes4 = pd.read_csv('../data_inteli/month_5.csv')
-df_mes5 = pd.read_csv('../data_inteli/month_6.csv')
+arquivos_mensais = ensure_parquet_cache()
 
 
 # %% [markdown]
 # ### 4.1.4. Concatenação de todos os dataframes em um só
 
 # %%
-df_combined = pd.concat([df_mes1, df_mes2, df_mes3, df_mes4, df_mes5], ignore_index=True)
+df_combined = load_months(arquivos_mensais)
 df_combined.info()
 
 # %% [markdown]
@@ -570,14 +565,18 @@ print(f"IG1K-L-v2: {quantidade_ig:.2f}")
 print(f"Diferença: IG1K-L-v2 possui {quantidade_ig - quantidade_infinity} linhas a mais")
 
 # %% [markdown]
-# ### 4.2.4. Faz encodificação ONE HOT com coluna inputType
+# ### 4.2.4. Mantém a coluna model como categórica
 
 # %% [markdown]
 # &nbsp;&nbsp;&nbsp;&nbsp;A encodificação One Hot consiste em uma transformação que é aplicada em valores categóricos. Com essa encodificação, é possível criar uma espécie de tabela verdade para as categorias. No nosso caso, realizamos tal encodificação para a coluna 'model', que possui dois valores (Infinity V2 e IG1K-L-v2). Dessa forma, foram criadas duas novas colunas, cada uma com o nome de um dos medidores e contendo um valor booleano. Se o valor booleano for verdadeiro, significa que aquela leitura foi feita com tal medidor. Esta estratégia é adotada para conseguir transformar os valores categóricos dos medidos em numéricos/booleanos.
 
+# &nbsp;&nbsp;&nbsp;&nbsp;Para economizar memória no dataframe de cerca de 3.000.000 de linhas, a coluna 'model' (e as demais colunas categóricas do cadastro) é mantida como categórica, guardando apenas um código inteiro de 1 byte por linha. As colunas One Hot (por exemplo, 'model_Infinity V2') são criadas como uint8 apenas na entrada dos modelos, com a função `model_input` do módulo `codificacao.py`.
+
 # %%
-df_combined = pd.get_dummies(df_combined, columns=['model'])
-df_combined
+from codificacao import to_categorical, fill_categorical, map_categories, model_input
+
+df_combined = to_categorical(df_combined, ['model'])
+df_combined['model'].cat.categories
 
 # %% [markdown]
 # ### 4.2.5. Realiza a encodificação por label da coluna inputType
@@ -589,7 +588,7 @@ df_combined
 # %%
 encoder = LabelEncoder()
 
-df_combined['inputType_encoded'] = df_combined['inputType'].map({'DI1': 1, 'DI2': 2, 'DI3': 3, 'DI4': 4, 'DI5': 5, 'DI6': 6, 'DI7': 7, 'DI8': 8, 'leituraRemota': 9})
+df_combined['inputType_encoded'] = df_combined['inputType'].astype(str).map({'DI1': 1, 'DI2': 2, 'DI3': 3, 'DI4': 4, 'DI5': 5, 'DI6': 6, 'DI7': 7, 'DI8': 8, 'leituraRemota': 9})
 
 unique_inputType_encoded = df_combined['inputType_encoded'].unique()
 for input_type in unique_inputType_encoded:
@@ -632,11 +631,12 @@ df_combined.isna().sum()
 # &nbsp;&nbsp;&nbsp;&nbsp;No caso abaixo, percebemo que todas as linhas que possuíam o medidor como Inifinity V2 tinham a coluna *'gain'* inexistente. Dessa forma, substituimos estes valores faltantes por 0.
 
 # %%
-df_combined.loc[df_combined['model_Infinity V2'] == True, 'gain'] = 1
+df_combined.loc[df_combined['model'] == 'Infinity V2', 'gain'] = 1
 
 # %%
 df_combined.isna().sum()
-df_combined.fillna(0, inplace=True)
+## Apenas as colunas numéricas recebem 0 (as categóricas, como clientCode e model, não aceitam a nova categoria 0)
+df_combined.fillna({coluna: 0 for coluna in df_combined.select_dtypes('number').columns}, inplace=True)
 df_combined.isna().sum()
 
 # %% [markdown]
@@ -718,7 +718,7 @@ numeric_columns = ['meterIndex', 'initialIndex', 'pulseCount', 'model_IG1K-L-v2'
 from sklearn.ensemble import IsolationForest
 
 model = IsolationForest(contamination=0.01, random_state=42)
-df_combined['anomaly'] = model.fit_predict(df_combined[numeric_columns])
+df_combined['anomaly'] = model.fit_predict(model_input(df_combined, numeric_columns))
 
 # %%
 df_combined['anomaly'].value_counts()
@@ -747,14 +747,14 @@ df_cadastro.drop(columns=['condCode', 'contratacao', 'cep'], inplace=True)
 df_cadastro
 
 # %% [markdown]
-# ### 4.5.2. Encodificação One Hot da coluna situação
+# ### 4.5.2. Conversão da coluna situação para categórica
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Como explicado anteriormente, a encodificação One Hot cria colunas de valores booleanos que formarão uma tabela verdade em relação ao estado da coluna 'situacao'. 
+# &nbsp;&nbsp;&nbsp;&nbsp;Como explicado anteriormente, a encodificação One Hot cria colunas de valores booleanos que formarão uma tabela verdade em relação ao estado da coluna 'situacao'. Essa tabela verdade é gerada apenas na entrada dos modelos; até lá, a coluna é mantida como categórica.
 
 # %%
-df_cadastro = pd.get_dummies(df_cadastro, columns=['situacao'])
-df_cadastro
+df_cadastro = to_categorical(df_cadastro, ['situacao'])
+df_cadastro['situacao'].cat.categories
 
 # %% [markdown]
 # ### 4.5.3. Contagem de valores de cada perfil de consumo
@@ -773,11 +773,11 @@ perfil_consumo_counts
 df_cadastro['perfil_consumo'] = df_cadastro['perfil_consumo'].replace('-', 'Cocção + Aquecedor')
 
 # %% [markdown]
-# ### 4.5.5 Encodificação One Hot da coluna perfil_consumo
+# ### 4.5.5 Conversão das colunas perfil_consumo, cidade e categoria para categóricas
 
 # %%
-df_cadastro = pd.get_dummies(df_cadastro, columns=['perfil_consumo'])
-df_cadastro
+df_cadastro = to_categorical(df_cadastro, ['perfil_consumo', 'cidade', 'categoria'])
+df_cadastro.dtypes
 
 # %% [markdown]
 # ### 4.5.6 Identificação de categorias mais frequentes que aparecem no dataframe
@@ -802,7 +802,7 @@ len(df_combined['clientCode'].unique())
 # &nbsp;&nbsp;&nbsp;&nbsp;Esse trecho serve para comprovar a hipótese de que existem, na base dados, clientes com mais de uma instalação. 
 
 # %%
-df_combined.groupby('clientCode')['clientIndex'].nunique().gt(1).any()
+df_combined.groupby('clientCode', observed=True)['clientIndex'].nunique().gt(1).any()
 
 # %% [markdown]
 # ### 4.5.9 Identificando instalações unicas (instalação = combinação única entre clientCode e clientIndex)
@@ -811,7 +811,8 @@ df_combined.groupby('clientCode')['clientIndex'].nunique().gt(1).any()
 # &nbsp;&nbsp;&nbsp;&nbsp;Assim como na tabela de consumo, a tabela de dados cadastrais também possui as colunas clientCode e clientIndex. Segundo o dicionário de dados, o clientCode é um valor identificador de um cliente, podendo ser, por exemplo, um CPF. Já o clientIndex é um identificador único para uma instalação de determinado cliente. Dessa forma, podemos entender que podem existir diversas linhas que possuem o mesmo clientCode porém clientIndex diferentes, e isso significa que um mesmo cliente possui mais de uma instalação em seu nome.
 
 # %%
-unique_combinations = df_combined.groupby(['clientCode', 'clientIndex']).size()
+## observed=True: com clientCode categórico, apenas as combinações presentes nos dados são contadas
+unique_combinations = df_combined.groupby(['clientCode', 'clientIndex'], observed=True).size()
 quantidade_unicas = unique_combinations.count()
 print(f"Quantidade de linhas com combinações únicas de clientCode e clientIndex: {quantidade_unicas}")
 
@@ -833,34 +834,19 @@ df_merged
 # ### 4.5.11 Corrigindo valores que ficaram sem correspondencia após merge das tabelas
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Um problema que identificamos ao explorar os dados cadastrais foi a falta de dados em relação à tabela de consumo, ou seja, existiam clientes e instalações que possuíam dados de consumo porém não possuíam dados cadastrais. Por conta disso, ao realizar a junção das tabelas, cerca de 117.000 linhas da tabela de consumo ficaram sem correspondência com a tabela de dados cadastrais. Consequentemente, foi necessário realizar uma correção nestes dados. Ademais, vale ressaltar que, por conta de boa parte das colunas que ficaram sem correspondência terem sido encodificadas com o método One Hot, precisamos ajustar cada coluna específica individualmente.
-
-# %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Definimos que toda linha que estivesse sem valor de situação de contrato seria substituída pelo valor mais frequente, que é "Consumindo gás".
-
-# %%
-df_merged['situacao_CONSUMINDO GÁS'] = df_merged['situacao_CONSUMINDO GÁS'].fillna(True)
-df_merged['situacao_CONTRATADO'] = df_merged['situacao_CONTRATADO'].fillna(False)
-df_merged['situacao_DESATIVADO'] = df_merged['situacao_DESATIVADO'].fillna(False)
-
-# %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Definimos que toda linha que não possuísse dados acerca do perfil de consumo seria substituída pelo valor mais recorrente na coluna, sendo este o "Cocção + Aquecedor".
-
-# %%
-df_merged['perfil_consumo_Cocção + Aquecedor'] = df_merged['perfil_consumo_Cocção + Aquecedor'] = df_merged['perfil_consumo_Cocção + Aquecedor'].fillna(True)
-df_merged['perfil_consumo_Aquecedor'] = df_merged['perfil_consumo_Aquecedor'].fillna(False)
-df_merged['perfil_consumo_Cocção'] = df_merged['perfil_consumo_Cocção'].fillna(False)
-df_merged['perfil_consumo_Caldeira'] = df_merged['perfil_consumo_Caldeira'].fillna(False)
-df_merged['perfil_consumo_Cocção + Aquecedor + Piscina'] = df_merged['perfil_consumo_Cocção + Aquecedor + Piscina'].fillna(False)
-df_merged['perfil_consumo_Cocção + Caldeira'] = df_merged['perfil_consumo_Cocção + Caldeira'].fillna(False)
+# &nbsp;&nbsp;&nbsp;&nbsp;Um problema que identificamos ao explorar os dados cadastrais foi a falta de dados em relação à tabela de consumo, ou seja, existiam clientes e instalações que possuíam dados de consumo porém não possuíam dados cadastrais. Por conta disso, ao realizar a junção das tabelas, cerca de 117.000 linhas da tabela de consumo ficaram sem correspondência com a tabela de dados cadastrais. Consequentemente, foi necessário realizar uma correção nestes dados. Como as colunas de cadastro foram mantidas categóricas, basta preencher uma coluna por atributo (e não cada coluna One Hot individualmente).
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Assim como nas células acima, substituimos os valores faltantes das colunas de categoria, bairro, cidade e condIndex pela moda da coluna, ou seja, também pelo valor mais frequente.
+# &nbsp;&nbsp;&nbsp;&nbsp;Definimos que toda linha que estivesse sem valor de situação de contrato seria substituída pelo valor mais frequente, que é "Consumindo gás", e que toda linha que não possuísse dados acerca do perfil de consumo seria substituída pelo valor mais recorrente na coluna, sendo este o "Cocção + Aquecedor". Para as colunas de categoria, bairro, cidade e condIndex, os valores faltantes são substituídos pela moda da coluna, ou seja, também pelo valor mais frequente.
 
 # %%
-df_merged['categoria'] = df_merged['categoria'].fillna(categoria_mais_frequente)
+df_merged = fill_categorical(df_merged, {
+    'situacao': 'CONSUMINDO GÁS',
+    'perfil_consumo': 'Cocção + Aquecedor',
+    'categoria': categoria_mais_frequente,
+    'cidade': df_merged['cidade'].mode().iloc[0],
+})
 df_merged['bairro'] = df_merged['bairro'].fillna(df_merged['bairro'].mode().iloc[0])
-df_merged['cidade'] = df_merged['cidade'].fillna(df_merged['cidade'].mode().iloc[0])
 df_merged['condIndex'] = df_merged['condIndex'].fillna(df_merged['condIndex'].mode().iloc[0])
 
 # %%
@@ -886,33 +872,20 @@ df_merged['cidade'].unique()
 # #### 4.5.12.1 Unificando os nomes das cidades
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Aqui, foram identificadas as colunas de cidade que traziam o mesmo valor, mas escrito de forma diferente (com e sem acento). Assim, também efetuamos a concatenação e juntamos todos os valores em uma única coluna para cada cidade.
+# &nbsp;&nbsp;&nbsp;&nbsp;Aqui, foram identificadas as cidades que traziam o mesmo valor, mas escrito de forma diferente (com e sem acento). Assim, também unificamos esses valores em uma única categoria para cada cidade, no mesmo formato dos nomes dos arquivos de temperatura (por exemplo, 'novo_hamburgo'). A normalização é aplicada apenas às categorias, e não a cada linha.
 
 # %%
 import unidecode
 
 # Remover acentos, converter para minúsculas, e garantir consistência
-df_merged['cidade'] = df_merged['cidade'].str.lower()
-df_merged['cidade'] = df_merged['cidade'].apply(lambda x: unidecode.unidecode(x))
-df_merged['cidade'] = df_merged['cidade'].str.strip()
+df_merged['cidade'] = map_categories(df_merged['cidade'], lambda x: unidecode.unidecode(x.lower()).strip().replace(' ', '_'))
+df_merged['cidade'].cat.categories
 
 # %% [markdown]
-# #### 4.5.12.2 Encodificação One Hot da coluna cidade
-
-# %%
-df_merged = pd.get_dummies(df_merged, columns=['cidade'])
-
-# %%
-df_merged.rename(columns={'cidade_novo hamburgo': 'cidade_novo_hamburgo', 'cidade_porto alegre': 'cidade_porto_alegre', 'cidade_sao leopoldo':'cidade_sao_leopoldo'}, inplace=True)
-
-# %%
-df_merged.info()
+# #### 4.5.12.2 Colunas One Hot de cidade e categoria
 
 # %% [markdown]
-# ### 4.5.13 Encodificação One Hot da coluna categoria
-
-# %%
-df_merged = pd.get_dummies(df_merged, columns=['categoria'])
+# &nbsp;&nbsp;&nbsp;&nbsp;As colunas One Hot de cidade e categoria (por exemplo, 'cidade_canoas' e 'categoria_RES. UNIFAMILIAR') não são mais criadas no dataframe: quando um modelo precisar delas, `model_input` as gera como uint8 a partir das colunas categóricas.
 
 # %%
 df_merged.info()
@@ -985,89 +958,89 @@ df_merged.info()
 # ```
 
 # %% [markdown]
-# ### 4.6.1. Leitura de arquivos csv e concatenação em um dataframe 
-
-# %%
-csv_files = {
-    'canoas': '../daily_avg_temps_canoas.csv',
-    'gravatai': '../daily_avg_temps_gravatai.csv',
-    'novo_hamburgo': '../daily_avg_temps_novo_hamburgo.csv',
-    'porto_alegre': '../daily_avg_temps_porto_alegre.csv',
-    'sao_leopoldo': '../daily_avg_temps_sao_leopoldo.csv'
-}
+# &nbsp;&nbsp;&nbsp;&nbsp;No exemplo acima, cada cidade possui um endpoint e os meses são buscados um após o outro, de forma que adicionar cidades ou anos aumenta o tempo de coleta proporcionalmente. Para novas coletas, o script `coleta_temperaturas.py` busca todas as cidades e meses em paralelo, com um limite de conexões simultâneas e de requisições por segundo da API, novas tentativas com espera exponencial em caso de erro e um cache em disco das respostas por (latitude, longitude, mês). A saída é diretamente a tabela de temperaturas médias diárias (cidade, data, temp), que pode ser importada na tabela local de temperaturas abaixo:
+# 
+# ```python
+# from coleta_temperaturas import WeatherbitProvider, fetch_daily_temperatures
+# from temperatura import TemperatureStore
+# 
+# provedor = WeatherbitProvider(os.getenv('API_KEY'))
+# df_diario = fetch_daily_temperatures(provedor, inicio='2024-02', fim='2024-06')
+# TemperatureStore.from_frame(df_diario).interpolate().save()
+# ```
 
-## cria uma lista com os dataframes de temperatura e depois os concatena
-temp_data = []
-for cidade, file_name in csv_files.items():
-    temp_df = pd.read_csv(file_name)
-    temp_df['cidade'] = cidade  
-    temp_data.append(temp_df)
+# %% [markdown]
+# ### 4.6.1. Tabela local de temperaturas
 
-df_temperatura = pd.concat(temp_data, ignore_index=True)
+# %% [markdown]
+# &nbsp;&nbsp;&nbsp;&nbsp;Os arquivos CSV gerados pela API (um por cidade, `daily_avg_temps_<cidade>.csv`) estão no arquivo `csvs_temperaturas.rar`. O módulo `temperatura.py` importa esses arquivos uma única vez para uma tabela local compacta, em que cada temperatura é indexada pelo código da cidade e pelo número do dia. Os dias sem medição são preenchidos por interpolação linear entre os dias vizinhos da mesma cidade. Nas execuções seguintes, a tabela é lida diretamente do arquivo Parquet salvo.
 
 # %%
-df_temperatura.rename(columns={'date': 'data'}, inplace=True)
+from temperatura import load_temperature_store
+
+temperaturas = load_temperature_store()
+df_temperatura = temperaturas.to_frame()
 df_temperatura
 
 # %% [markdown]
-# ### 4.6.2. Conversão de coluna de datas para tipo datetime
+# ### 4.6.2. Cidades presentes na tabela de temperaturas
 
 # %%
-# Converter a coluna 'data' para datetime
-df_temperatura['data'] = pd.to_datetime(df_temperatura['data'])
+temperaturas.cidades
 
 # %% [markdown]
 # ### 4.6.3. Leitura das cidades do dataframe
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Aqui, foi utilizada uma técnica de chunks para que o processamento pudesse ser feito em toda a tabela. Sem isso, o kernel não possui recursos suficientes para processar a função get_cidade para todas as linhas. Com tal abordagem, o processamento 100.000 linhas por vez, sendo que o dataset inteiro possui cerca de 3.000.000 de linhas em sua totalidade.
+# &nbsp;&nbsp;&nbsp;&nbsp;Como a coluna 'cidade' é mantida categórica (seção 4.5.12), ela já pode ser usada diretamente na busca das temperaturas, sem reconstruí-la linha a linha a partir das colunas One Hot. Para frames que só possuam as colunas One Hot, a função `decode_one_hot` do módulo `codificacao.py` reconstrói a coluna categórica em uma única passada.
 
 # %%
-chunk_size = 100000 ## Vai processar 100.000 linhas por vez
+df_merged['cidade'].value_counts()
 
-results = []
+# %% [markdown]
+# ### 4.6.4. Adição das temperaturas ao dataframe principal
 
-def get_cidade(row):
-    for cidade in csv_files.keys():
-        if row[f'cidade_{cidade}']:
-            return cidade
-    return None
+# %% [markdown]
+# &nbsp;&nbsp;&nbsp;&nbsp;Aqui, adicionamos todos os dados de temperatura no dataframe principal, relacionando os dados de cidade e data de ambas as tabelas. Em vez de um merge pela cidade e pela data, a temperatura de cada linha é lida diretamente da tabela local pela posição (código da cidade, número do dia).
 
-for start in range(0, len(df_merged), chunk_size):
-    end = min(start + chunk_size, len(df_merged))
-    chunk = df_merged.iloc[start:end].copy()
+# %%
+df_merged['temp'] = temperaturas.lookup(df_merged['cidade'], df_merged['datetime'])
 
-    chunk['cidade'] = chunk.apply(get_cidade, axis=1)
+df_merged.info()
 
-    chunk['data'] = chunk['datetime'].dt.date
+# %% [markdown]
+# &nbsp;&nbsp;&nbsp;&nbsp;Por fim, removemos colunas auxiliáres que não serão mais utilizadas.
 
-    results.append(chunk)
+# %%
+df_merged = df_merged.drop(columns=['anomaly'])
+df_merged.info()
+
+# %%
+df_merged['clientCode']
 
 # %% [markdown]
-# ### 4.6.4. Merge do dataframe de temperaturas com o dataframe principal
+# #### 4.6.4.1. Otimização dos tipos de dados
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Aqui, adicionamos todos os dados de temperatura no dataframe principal, relacionando os dados de cidade e data de ambas as tabelas.
+# &nbsp;&nbsp;&nbsp;&nbsp;Após o merge dos dados de consumo, cadastro e temperatura, boa parte das colunas numéricas está em float64/int64 e colunas de texto repetido (como clientCode e bairro) guardam uma string por linha. Como todo o processamento é feito em uma única máquina, com memória limitada, a função `optimize_memory` do módulo `memoria.py` reduz cada coluna para o menor tipo possível (float32, int32, int16, int8/uint8 e category), mantendo em float64 o timestamp, as leituras do medidor e as colunas usadas no cálculo do consumo (pulseCount e gain), e exibe um relatório da memória antes e depois. Com o orçamento de memória informado, é possível saber de antemão se o dataset completo cabe na máquina.
 
 # %%
-df_merged = pd.concat(results, ignore_index=True)
+from memoria import optimize_memory
 
-df_merged['data'] = pd.to_datetime(df_merged['data']).dt.date
-df_temperatura['data'] = pd.to_datetime(df_temperatura['data']).dt.date
+df_merged, relatorio_memoria = optimize_memory(df_merged, orcamento_mb=4096)
+relatorio_memoria
 
-df_merged = pd.merge(df_merged, df_temperatura, left_on=['cidade', 'data'], right_on=['cidade', 'data'], how='left')
-
-df_merged.info()
+# %% [markdown]
+# #### 4.6.4.2. Identificador e índice das instalações
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Por fim, removemos colunas auxiliáres que não serão mais utilizadas.
+# &nbsp;&nbsp;&nbsp;&nbsp;Diversas operações agrupam ou filtram o dataframe pela chave composta clientCode + clientIndex, sendo o clientCode uma string de 64 caracteres. Para evitar isso, cada instalação recebe uma única vez um `installation_id` inteiro (int32) e o dataframe é ordenado por instalação e data. O `InstallationIndex` guarda onde começa e termina o bloco de linhas de cada instalação, de forma que a série de uma instalação é obtida por fatiamento, sem aplicar uma máscara booleana sobre as cerca de 3.000.000 de linhas. Como o clientCode_encoded corresponde a um único clientCode, ele é usado como chave do índice.
 
 # %%
-df_merged = df_merged.drop(columns=['cidade', 'data', 'anomaly'])
-df_merged.info()
+from instalacoes import build_installation_index, compute_lag_features
 
-# %%
-df_merged['clientCode']
+df_merged, indice_instalacoes = build_installation_index(df_merged, tempo='datetime', chaves=['clientCode_encoded', 'clientIndex'])
+print(f"{len(indice_instalacoes)} instalações indexadas")
 
 # %% [markdown]
 # ### 4.6.5. Aplicação de Standard Scaler para todas colunas numéricas
@@ -1075,20 +1048,17 @@ df_merged['clientCode']
 # %% [markdown]
 # &nbsp;&nbsp;&nbsp;&nbsp;O StandardScaler é uma poderosa ferramenta capaz de colocar conjuntos de valores numéricos em uma mesma escala. Isso se faz necessário pois possuímos valores em escalas de 0 a 1 e outros que variam de 0 a 100, por exemplo. Sem a normalização destes dados, os valores com maior escala terão muito maior influência sobre o modelo preditivo. Portanto, é de extrema necessidade que utilizemos uma ferramenta como o StandardScaler para colocar todos os valores numéricos na mesma escala de grandeza.
 
+# &nbsp;&nbsp;&nbsp;&nbsp;Como o StandardScaler padroniza cada coluna de forma independente, apenas as colunas padronizadas usadas pelos modelos (hoje, 'temp_scaled') são adicionadas ao dataframe, em float32. Assim, não é mantida uma cópia completa do dataframe original nem uma versão padronizada de todas as colunas numéricas.
+
 # %%
-numeric_columns = df_merged.select_dtypes(include=['float64', 'int64']).columns
+numeric_columns = ['temp']
 
 
 # %%
 from sklearn.preprocessing import StandardScaler
 
-df_merged_original = df_merged.copy()
-
 scaler = StandardScaler()
-df_merged_scaled = pd.DataFrame(scaler.fit_transform(df_merged[numeric_columns]), 
-                                columns=[col + '_scaled' for col in numeric_columns])
-
-df_merged = pd.concat([df_merged_original, df_merged_scaled], axis=1)
+df_merged[[col + '_scaled' for col in numeric_columns]] = scaler.fit_transform(df_merged[numeric_columns]).astype('float32')
 
 # %%
 df_merged.head()
@@ -1119,15 +1089,10 @@ df_merged['timestamp'] = pd.to_datetime(df_merged['timestamp'], unit='s')
 
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Ordenação do dataframe, agrupamento por instalação única, diferença entre as linhas para encontrar a variação e reset do index.
+# &nbsp;&nbsp;&nbsp;&nbsp;O dataframe já está ordenado por instalação e data desde a seção 4.6.4.2. Assim, a variação de consumo, o tempo desde a última medição (delta_time, usado na seção 4.9) e o consumo horarizado são calculados juntos, em uma única passada: a diferença entre cada linha e a anterior é calculada de uma vez, e as linhas que iniciam uma instalação (conhecidas pelo índice de instalações) recebem 0, sem reordenar o dataframe nem agrupar por instalação.
 
 # %%
-
-df_merged = df_merged.sort_values(by=['clientIndex', 'clientCode_encoded', 'timestamp'])
-
-df_merged['variação_consumo'] = df_merged.groupby(['clientIndex', 'clientCode_encoded'])['consumo em m^3'].diff()
-
-df_merged = df_merged.reset_index(drop=True)
+df_merged = compute_lag_features(df_merged, indice_instalacoes, consumo='consumo em m^3', tempo='datetime')
 
 (df_merged[['clientIndex', 'clientCode_encoded', 'timestamp', 'consumo em m^3', 'variação_consumo']])
 
@@ -1143,10 +1108,7 @@ df_merged['instalacao_change'] = (df_merged['clientIndex'] != df_merged['clientI
 
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;Valores nulos das transições entre instalações únicas são preenchidos como 0.
-
-# %%
-df_merged['variação_consumo'].fillna(0, inplace=True)
+# &nbsp;&nbsp;&nbsp;&nbsp;As transições entre instalações únicas já recebem variação 0.
 
 # %%
 (df_merged[df_merged['instalacao_change']].head(40))
@@ -1164,8 +1126,8 @@ len(df_merged['variação_consumo'])
 # &nbsp;&nbsp;&nbsp;&nbsp;Criação de gráfico para cálculo da variação do consumo total de um cliente
 
 # %%
-df_merged = df_merged.sort_values(by=['timestamp'])
-df_instalacao = df_merged[(df_merged['clientIndex'] == 0) & (df_merged['clientCode_encoded'] == 0)]
+## A série da instalação já está em ordem cronológica no bloco do índice
+df_instalacao = indice_instalacoes.get(df_merged, 0, 0)
 
 plt.figure(figsize=(10, 6))
 plt.plot(df_instalacao['timestamp'], df_instalacao['variação_consumo'], marker='o')
@@ -1177,8 +1139,8 @@ plt.grid(True)
 plt.show()
 
 # %%
-df_merged = df_merged.sort_values(by=['timestamp'])
-df_instalacao = df_merged[((df_merged['clientIndex'] == 0) & (df_merged['clientCode_encoded'] == 0)) & (df_merged['timestamp'] >= '2024-03-28 23:15:58') & (df_merged['timestamp'] <= '2024-05-02 00:00:00')]
+df_instalacao = indice_instalacoes.get(df_merged, 0, 0)
+df_instalacao = df_instalacao[(df_instalacao['timestamp'] >= '2024-03-28 23:15:58') & (df_instalacao['timestamp'] <= '2024-05-02 00:00:00')]
 
 plt.figure(figsize=(10, 6))
 plt.plot(df_instalacao['timestamp'], df_instalacao['variação_consumo'], marker='o')
@@ -1219,8 +1181,8 @@ print(f"Outliers identificados: {len(outliers)}")
 # ### 4.7.1. Contagem de instalações únicas que foram identificadas como outliers
 
 # %%
-unique_installations = outliers.groupby(['clientCode', 'clientIndex']).size()
-num_unique_installations = unique_installations.count()
+unique_installations = outliers['installation_id'].value_counts()
+num_unique_installations = len(unique_installations)
 print(f"Número de instalações únicas outliers: {num_unique_installations}")
 
 # %%
@@ -1236,28 +1198,28 @@ unique_installations
 # &nbsp;&nbsp;&nbsp;&nbsp;Para melhor entender o balanceamento dos dados de consumo dos clientes entre as diferentes categorias existentes e como a diferença de densidade poderia afetar os modelos não supervisionados, foi feita a análise de quantos clientes existiam por cada categoria.
 
 # %%
-categorias = df_merged[['categoria_CONSTRUTORAS COLETIVO', 'categoria_PRÉDIO EXISTENTE INDIVIDUAL', 'categoria_PRÉDIOS EXISTENTES COLETIVOS', 'categoria_RES. UNIFAMILIAR']]
+categorias = df_merged['categoria'].value_counts()
 
 # %%
-total_linhas = len(categorias)
+total_linhas = len(df_merged)
 
 # %%
-construtoras = categorias.loc[(categorias['categoria_CONSTRUTORAS COLETIVO'] == True)].sum()
+construtoras = categorias['CONSTRUTORAS COLETIVO']
 
 porcentagem_construtoras = (construtoras / total_linhas) * 100
 
 # %%
-predio_individual = categorias.loc[(categorias['categoria_PRÉDIO EXISTENTE INDIVIDUAL'] == True)].sum()
+predio_individual = categorias['PRÉDIO EXISTENTE INDIVIDUAL']
 
 porcentagem_predio_individual = (predio_individual / total_linhas) * 100
 
 # %%
-predio_coletivo = categorias.loc[(categorias['categoria_PRÉDIOS EXISTENTES COLETIVOS'] == True)].sum()
+predio_coletivo = categorias['PRÉDIOS EXISTENTES COLETIVOS']
 
 porcentagem_predio_coletivo = (predio_coletivo / total_linhas) * 100
 
 # %%
-res_unifamiliar = categorias.loc[(categorias['categoria_RES. UNIFAMILIAR'] == True)].sum()
+res_unifamiliar = categorias['RES. UNIFAMILIAR']
 
 porcentagem_res_unifamiliar = (res_unifamiliar / total_linhas) * 100    
 
@@ -1265,25 +1227,15 @@ porcentagem_res_unifamiliar = (res_unifamiliar / total_linhas) * 100
 # ## 4.9 Horarização da variação de consumo
 
 # %% [markdown]
-# &nbsp;&nbsp;&nbsp;&nbsp;A coluna de variação de consumo, apesar de ser muito útil para a análise do consumo de gás de cada cliente, ainda possuía uma falta: a diluição do consumo pelo tempo que se passou desde a última medição. Assim, foi realizada a horarização do consumo, ou seja, diluição da variação de consumo em uma taxa média por horas que se passaram desde a última medição.
+# &nbsp;&nbsp;&nbsp;&nbsp;A coluna de variação de consumo, apesar de ser muito útil para a análise do consumo de gás de cada cliente, ainda possuía uma falta: a diluição do consumo pelo tempo que se passou desde a última medição. Assim, foi realizada a horarização do consumo, ou seja, diluição da variação de consumo em uma taxa média por horas que se passaram desde a última medição. As colunas delta_time (em horas) e consumo_horarizado foram calculadas junto com a variação de consumo, na seção 4.6.7, com a mesma ordenação por instalação e data.
 
 # %%
-df_merged.sort_values(by=['clientCode', 'clientIndex', 'datetime'], inplace=True)
-
-df_merged['delta_time'] = df_merged.groupby(['clientCode', 'clientIndex'])['datetime'].diff().dt.total_seconds() / 3600  # em horas
-
-df_merged['delta_time'].fillna(0, inplace=True)
-
-df_merged['consumo_horarizado'] = df_merged['variação_consumo'] / df_merged['delta_time']
-
-df_merged['consumo_horarizado'].replace([float('inf'), -float('inf')], 0, inplace=True)
-df_merged['consumo_horarizado'].fillna(0, inplace=True)
 
 df_merged[['clientCode', 'clientIndex', 'datetime', 'variação_consumo', 'delta_time', 'consumo_horarizado']].head()
 
 # %%
-# Filtra uma instalação específica
-instalacao = df_merged[(df_merged['clientCode_encoded'] == 37) & (df_merged['clientIndex'] == 0)]
+# Filtra uma instalação específica (o dataframe está ordenado por instalação e data)
+instalacao = indice_instalacoes.get(df_merged, 37, 0)
 
 # Cria o gráfico de linha
 plt.figure(figsize=(10, 6))
@@ -1301,6 +1253,19 @@ plt.legend()
 plt.tight_layout()
 plt.show()
 
+# %% [markdown]
+# ### 4.9.1 Processamento incremental de novos meses
+
+# %% [markdown]
+# &nbsp;&nbsp;&nbsp;&nbsp;Para que a chegada de um novo mês (por exemplo, `month_7.csv`) não exija reprocessar todo o histórico, o módulo `ingestao.py` guarda uma partição processada por mês e o estado da última leitura de cada instalação (clientCode, clientIndex, datetime e consumo em m^3). Ao processar um mês novo, a primeira leitura de cada instalação é comparada com esse estado, de forma que `variação_consumo`, `delta_time` e `consumo_horarizado` na virada do mês são iguais aos obtidos com o histórico completo. Basta adicionar o novo arquivo à lista e rodar a célula abaixo: apenas os meses sem partição são processados.
+
+# %%
+from ingestao import MONTH_FILES, process_new_months, load_processed
+
+particoes = process_new_months(MONTH_FILES)
+df_incremental = load_processed(particoes, columns=['clientCode', 'clientIndex', 'datetime', 'variação_consumo', 'delta_time', 'consumo_horarizado'])
+df_incremental.head()
+
 # %% [markdown]
 # # 5. Hipóteses
 
@@ -1353,10 +1318,10 @@ plt.show()
 # ### 5.2.1. Contagem de valores e cálculo de porcentagem
 
 # %%
-df_merged['categoria_RES. UNIFAMILIAR'].value_counts()
+(df_merged['categoria'] == 'RES. UNIFAMILIAR').value_counts()
 
 # %%
-df_res_unifamiliar = df_merged[df_merged['categoria_RES. UNIFAMILIAR'] == True]
+df_res_unifamiliar = df_merged[df_merged['categoria'] == 'RES. UNIFAMILIAR']
 
 num_instalacoes_res_unifamiliar = df_res_unifamiliar.shape[0]
 
@@ -1384,10 +1349,9 @@ print(f"Porcentagem de instalações na categoria 'RES. UNIFAMILIAR': {porcentag
 
 # %%
 
-grupo_caldeira = df_merged[(df_merged['perfil_consumo_Caldeira'] == True) | 
-                           (df_merged['perfil_consumo_Cocção + Caldeira'] == True)]
-grupo_outros = df_merged[~((df_merged['perfil_consumo_Caldeira'] == True) | 
-                           (df_merged['perfil_consumo_Cocção + Caldeira'] == True))]
+perfis_caldeira = df_merged['perfil_consumo'].isin(['Caldeira', 'Cocção + Caldeira'])
+grupo_caldeira = df_merged[perfis_caldeira]
+grupo_outros = df_merged[~perfis_caldeira]
 
 media_caldeira = grupo_caldeira['meterIndex'].mean()
 media_outros = grupo_outros['meterIndex'].mean()
@@ -1436,7 +1400,7 @@ colunas_selecionadas = [
 
 
 # %%
-df_merged[colunas_selecionadas]
+model_input(df_merged, colunas_selecionadas)
 
 # %% [markdown]
 # ### 6.1.1. Justificativa das features
@@ -1503,8 +1467,8 @@ df_merged[colunas_selecionadas]
 
 # # %%
 # df_sample = df_merged.sample(frac=0.12, random_state=42) # 12% dos dados
-# ## Converte valores booleanos para int (True = 1, False = 0)
-# df_sample[colunas_selecionadas] = df_sample[colunas_selecionadas].astype(int)
+# ## As colunas One Hot são geradas apenas na amostra, com model_input, e convertidas para int
+# df_sample[colunas_selecionadas] = model_input(df_sample, colunas_selecionadas).astype(int)
 # df_sample[colunas_selecionadas].info()
 
 # # %% [markdown]
@@ -1515,24 +1479,25 @@ df_merged[colunas_selecionadas]
 # # &nbsp;&nbsp;&nbsp;&nbsp;No gráfico abaixo, os pontos de mesma cor são de mesma categoria, e foram apenas considerados os pontos de variação positiva de consumo de gás natural, em metros cúbicos. Nesse sentido, em hipótese, os pontos laranja representam em maior parte as linhas de consumo em que não houve, ou houve muito pouca, variação de consumo. Os pontos em azul significam uma diferença de consumo mais significativa, ao longo do tempo. Já os pontos em verde apresentam variação do consumo praticamente nula. No geral, uma parte reduzida dos dados que compõem o modelo evidencia variação; das 2.900.000 linhas, só 400.000 tem diferença e o restante não apresenta variação.
 
 # # %%
+# from clusterizacao import assign_clusters, streaming_kmeans
+
 # # Número de k definido pela equipe
 # k = 3
 
-# # Aplicando o K-Means, com o número de clusters 3
-# kmeans = KMeans(n_clusters=k, random_state=42)
-# kmeans.fit(df_sample[colunas_selecionadas]) #Adaptação do k-means às colunas selecionadas do dataframe
+# # Aplicando o K-Means em mini-batches, com o número de clusters 3, sobre a base inteira (lida em blocos de linhas)
+# kmeans = streaming_kmeans(df_merged, colunas_selecionadas, k)
 
-# # Atribuindo os clusters
-# df_sample['cluster'] = kmeans.labels_
-
-# # Calculando a distância aos centroides para cada ponto do gráfico
-# df_sample['distance_to_centroid'] = np.min(kmeans.transform(df_sample[colunas_selecionadas]), axis=1)
+# # Atribuindo os clusters e a distância ao centróide mais próximo de todas as linhas, bloco a bloco
+# df_merged['cluster'], df_merged['distance_to_centroid'], _ = assign_clusters(kmeans, df_merged, colunas_selecionadas)
 
 # # Definindo um limiar para identificar anomalias, os 5% de pontos com maiores distâncias serão consideradas como anomalias
-# threshold = np.percentile(df_sample['distance_to_centroid'], 95)
+# threshold = np.percentile(df_merged['distance_to_centroid'], 95)
 
 # # Identificando anomalias de acordo com o cálculo acima
-# df_sample['anomaly'] = df_sample['distance_to_centroid'] > threshold
+# df_merged['anomaly'] = df_merged['distance_to_centroid'] > threshold
+
+# # A amostra usada nos gráficos recebe os resultados calculados na base inteira
+# df_sample[['cluster', 'distance_to_centroid', 'anomaly']] = df_merged.loc[df_sample.index, ['cluster', 'distance_to_centroid', 'anomaly']]
 
 # df_sample_positive = df_sample[df_sample['variação_consumo'] >= 0]
 
@@ -1627,7 +1592,7 @@ df_merged[colunas_selecionadas]
 # #df_sample_no_anomalies = df_sample_positive[df_sample_positive['anomaly'] == False]
 
 # # Selecionar as colunas utilizadas para a criação dos clusters
-# #X = df_sample_no_anomalies[colunas_selecionadas]
+# #X = model_input(df_sample_no_anomalies, colunas_selecionadas)
 
 # # Calcular o coeficiente da silhueta
 # #silhouette_avg = silhouette_score(X, df_sample_no_anomalies['cluster'])
@@ -1656,14 +1621,15 @@ df_merged[colunas_selecionadas]
 # k = 3
 
 # # Aplicando o K-Means, com o número de clusters 3
+# X_sample = model_input(df_sample, colunas_selecionadas)
 # kmeans = KMeans(n_clusters=k, random_state=42)
-# kmeans.fit(df_sample[colunas_selecionadas]) #Adaptação do k-means às colunas selecionadas do dataframe
+# kmeans.fit(X_sample) #Adaptação do k-means às colunas selecionadas do dataframe
 
 # # Atribuindo os clusters
 # df_sample['cluster'] = kmeans.labels_
 
 # # Calculando a distância aos centroides para cada ponto do gráfico
-# df_sample['distance_to_centroid'] = np.min(kmeans.transform(df_sample[colunas_selecionadas]), axis=1)
+# df_sample['distance_to_centroid'] = np.min(kmeans.transform(X_sample), axis=1)
 
 # # Definindo um limiar para identificar anomalias, os 5% de pontos com maiores distâncias serão consideradas como anomalias
 # threshold = np.percentile(df_sample['distance_to_centroid'], 95)
@@ -1855,13 +1821,13 @@ df_merged[colunas_selecionadas]
 # from sklearn.cluster import KMeans
 # import matplotlib.pyplot as plt
 
-# # Testando diferentes valores de K para encontrar o ideal
-# inertia = []
+# from clusterizacao import streaming_elbow
+
+# # Testando diferentes valores de K para encontrar o ideal, com K-means em mini-batches sobre a base inteira
+# # (cada K parte dos centróides do K anterior)
 # K_range = range(1, 10)
-# for K in K_range:
-#     kmeans_test = KMeans(n_clusters=K, random_state=42)
-#     kmeans_test.fit(df_sample[colunas_selecionadas])
-#     inertia.append(kmeans_test.inertia_)
+# df_cotovelo, modelos_kmeans = streaming_elbow(df_merged, colunas_selecionadas, K_range)
+# inertia = df_cotovelo['inercia'].tolist()
 
 # plt.figure(figsize=(8, 6))
 # plt.plot(K_range, inertia, marker='o')
@@ -1886,8 +1852,9 @@ df_merged[colunas_selecionadas]
 # # Supondo que df_sample e colunas_selecionadas já estão definidos
 
 # # Aplicando o Isolation Forest
+# X_sample = model_input(df_sample, colunas_selecionadas)
 # iso_forest = IsolationForest(contamination=0.05, random_state=42)
-# df_sample['isof_anomaly'] = iso_forest.fit_predict(df_sample[colunas_selecionadas])
+# df_sample['isof_anomaly'] = iso_forest.fit_predict(X_sample)
 
 # # Convertendo a saída para binário (1 = anomalia, 0 = normal)
 # df_sample['isof_anomaly'] = df_sample['isof_anomaly'].apply(lambda x: 1 if x == -1 else 0)
@@ -1895,7 +1862,7 @@ df_merged[colunas_selecionadas]
 # # Verificando se temos pelo menos dois grupos para calcular o DBI
 # if len(df_sample['isof_anomaly'].unique()) > 1:
 #     # Calculando o Davies-Bouldin Index
-#     dbi_score = davies_bouldin_score(df_sample[colunas_selecionadas], df_sample['isof_anomaly'])
+#     dbi_score = davies_bouldin_score(X_sample, df_sample['isof_anomaly'])
 #     print(f"Davies-Bouldin Index (DBI) com Isolation Forest: {dbi_score}")
 # else:
 #     print("Não é possível calcular o Davies-Bouldin Index devido à falta de variação nas anomalias detectadas.")
@@ -1922,12 +1889,13 @@ df_merged[colunas_selecionadas]
 # # Verificação dos dados
 # if df_sample.empty:
 #     raise ValueError("O DataFrame df_sample está vazio.")
-# if not all(col in df_sample.columns for col in colunas_selecionadas):
+# X_sample = model_input(df_sample, colunas_selecionadas)
+# if not all(col in X_sample.columns for col in colunas_selecionadas):
 #     raise ValueError("Uma ou mais colunas selecionadas não estão presentes no DataFrame.")
 
 # # Pré-processamento dos dados
 # scaler = StandardScaler()
-# df_scaled = scaler.fit_transform(df_sample[colunas_selecionadas])
+# df_scaled = scaler.fit_transform(X_sample)
 
 # # ---- K-Means ----
 # try:
@@ -1982,7 +1950,7 @@ df_merged[colunas_selecionadas]
 #     'variação_consumo',
 # ]
 # df_sample = df_merged.sample(frac=0.06, random_state=42) # 12% dos dados
-# df_sample[colunas_selecionadas] = df_sample[colunas_selecionadas].astype('int64') # Convertendo para int
+# df_sample[colunas_selecionadas] = model_input(df_sample, colunas_selecionadas).astype('int64') # One Hot gerado na amostra e convertido para int
 
 # df_sample[colunas_selecionadas].info()
 
@@ -1993,14 +1961,15 @@ df_merged[colunas_selecionadas]
 # k = 3
 
 # # Aplicando o K-Means, com o número de clusters 3
+# X_sample = model_input(df_sample, colunas_selecionadas)
 # kmeans = KMeans(n_clusters=k, random_state=42)
-# kmeans.fit(df_sample[colunas_selecionadas]) #Adaptação do k-means às colunas selecionadas do dataframe
+# kmeans.fit(X_sample) #Adaptação do k-means às colunas selecionadas do dataframe
 
 # # Atribuindo os clusters
 # df_sample['cluster'] = kmeans.labels_
 
 # # Calculando a distância aos centroides para cada ponto do gráfico
-# df_sample['distance_to_centroid'] = np.min(kmeans.transform(df_sample[colunas_selecionadas]), axis=1)
+# df_sample['distance_to_centroid'] = np.min(kmeans.transform(X_sample), axis=1)
 
 # # Definindo um limiar para identificar anomalias, os 5% de pontos com maiores distâncias serão consideradas como anomalias
 # threshold = np.percentile(df_sample['distance_to_centroid'], 95)
@@ -2093,44 +2062,21 @@ df_merged[colunas_selecionadas]
 # # 
 
 # # %%
-# from scipy import stats
-# from tqdm import tqdm
-
-# # Lista de clusters presentes
-# clusters = df_sample['cluster'].unique()
+# from avaliacao import ks_matrix
 
-# # Dicionários para armazenar resultados
-# p_values = {}
-# p_stats = {}
+# # Teste KS entre todos os pares de clusters para cada feature: cada feature é ordenada uma única vez por cluster
+# df_ks = ks_matrix(df_sample, colunas_selecionadas, cluster='cluster', n_jobs=-1)
 
-# resultados = []
-
-# # Iterando sobre as colunas selecionadas
-# for col in tqdm(colunas_selecionadas):
-#     for i in range(len(clusters)):
-#         for j in range(i + 1, len(clusters)):
-#             cluster_i = df_sample[df_sample['cluster'] == clusters[i]]
-#             cluster_j = df_sample[df_sample['cluster'] == clusters[j]]
-            
-#             if len(cluster_i) > 0 and len(cluster_j) > 0:
-#                 # Executando o KS test entre dois clusters
-#                 stats_, pvalue = stats.kstest(cluster_i[col], cluster_j[col])
-#                 p_values[f'{col}_cluster_{clusters[i]}_vs_{clusters[j]}'] = pvalue
-#                 p_stats[f'{col}_cluster_{clusters[i]}_vs_{clusters[j]}'] = stats_
-
-#             # Adicionando os resultados à lista
-#                 resultados.append({
-#                     'Comparação': f'{col}_cluster_{clusters[i]}_vs_{clusters[j]}',
-#                     'KS Statistic': stats_,
-#                     'P-value': pvalue
-#                 })
-
-# # Convertendo para DataFrame
-# df_resultados = pd.DataFrame(resultados)
+# # Tabela no formato usado nos gráficos abaixo
+# df_resultados = pd.DataFrame({
+#     'Comparação': df_ks['feature'] + '_cluster_' + df_ks['cluster_a'].astype(str) + '_vs_' + df_ks['cluster_b'].astype(str),
+#     'KS Statistic': df_ks['stat'],
+#     'P-value': df_ks['pvalue'],
+# })
 
 # # Exibindo os resultados
-# for key in p_stats:
-#     print(f"Comparação: {key}, KS Statistic: {p_stats[key]:.4f}, P-value: {p_values[key]:.4f}")
+# for linha in df_resultados.itertuples(index=False):
+#     print(f"Comparação: {linha[0]}, KS Statistic: {linha[1]:.4f}, P-value: {linha[2]:.4f}")
 
 
 # # %% [markdown]
@@ -2301,7 +2247,7 @@ df_merged[colunas_selecionadas]
 #                      'categoria_RES. UNIFAMILIAR']
 
 # # Criando um DataFrame para plotagem
-# df_categoria = df_anomalias.melt(id_vars='anomaly', value_vars=colunas_categoria, 
+# df_categoria = model_input(df_anomalias, ['anomaly'] + colunas_categoria).melt(id_vars='anomaly', value_vars=colunas_categoria, 
 #                                  var_name='Categoria', value_name='Valor')
 
 # # Filtrando apenas as linhas onde a categoria é True
@@ -2337,9 +2283,8 @@ df_merged[colunas_selecionadas]
 # # &nbsp;&nbsp;&nbsp;&nbsp;O algoritmo abaixo roda o Kmeans para diversos valores em um intervalo de 1 a 10 e analisa a inercia em cada caso, ou seja, o quanto de variação existe entre um K e outro.
 
 # # %%
-# from sklearn.cluster import KMeans
+# from clusterizacao import streaming_elbow
 
-# inercia = []
 # colunas = [
 #     'temp_scaled',
 #     'meterIndex',
@@ -2361,11 +2306,9 @@ df_merged[colunas_selecionadas]
 
 # K_range = range(1, 11)
 
-
-# for k in K_range:
-#     kmeans = KMeans(n_clusters=k, random_state=42)
-#     kmeans.fit(df_merged[colunas])
-#     inercia.append(kmeans.inertia_)
+# # K-means em mini-batches: a base inteira é lida em blocos e cada K parte dos centróides do K anterior
+# df_cotovelo, modelos_kmeans = streaming_elbow(df_merged, colunas, K_range)
+# inercia = df_cotovelo['inercia'].tolist()
 
 
 # # %% [markdown]
@@ -2523,7 +2466,7 @@ df_merged[colunas_selecionadas]
 
 # # %%
 # # Filtrar dados apenas empresariais, agrupando as condições entre parênteses
-# df_empresarial = df_merged[(df_merged['categoria_CONSTRUTORAS COLETIVO']) | (df_merged['categoria_PRÉDIOS EXISTENTES COLETIVOS'])]
+# df_empresarial = df_merged[df_merged['categoria'].isin(['CONSTRUTORAS COLETIVO', 'PRÉDIOS EXISTENTES COLETIVOS'])]
 
 # # Criar pivot table para consumo empresarial
 # client_block_consumption_empresarial = df_empresarial.groupby(['clientCode_encoded', 'hour_block', 'clientIndex'])['variação_consumo'].mean().reset_index()
@@ -2620,7 +2563,7 @@ df_merged[colunas_selecionadas]
 
 # # %%
 # # Filtrar dados apenas residenciais
-# df_residencial = df_merged[~((df_merged['categoria_CONSTRUTORAS COLETIVO']) | (df_merged['categoria_PRÉDIOS EXISTENTES COLETIVOS']))]
+# df_residencial = df_merged[~df_merged['categoria'].isin(['CONSTRUTORAS COLETIVO', 'PRÉDIOS EXISTENTES COLETIVOS'])]
 
 # # Criar pivot table para consumo residencial
 # client_block_consumption_residencial = df_residencial.groupby(['clientCode_encoded', 'hour_block'])['variação_consumo'].mean().reset_index()
@@ -2721,6 +2664,7 @@ df_merged[colunas_selecionadas]
 # from sklearn.ensemble import IsolationForest
 # from sklearn.metrics import davies_bouldin_score, silhouette_score, calinski_harabasz_score
 # from sklearn.preprocessing import StandardScaler
+# from avaliacao import sampled_silhouette
 
 # # Função auxiliar para checar e validar dados
 # def validar_dados(df, colunas):
@@ -2731,11 +2675,12 @@ df_merged[colunas_selecionadas]
 #     return True
 
 # # Validação dos dados
-# validar_dados(df_sample, colunas_selecionadas)
+# X_sample = model_input(df_sample, colunas_selecionadas)
+# validar_dados(X_sample, colunas_selecionadas)
 
 # # Pré-processamento dos dados
 # scaler = StandardScaler()
-# df_scaled = scaler.fit_transform(df_sample[colunas_selecionadas])
+# df_scaled = scaler.fit_transform(X_sample)
 
 # # ---- Isolation Forest ----
 # try:
@@ -2761,11 +2706,10 @@ df_merged[colunas_selecionadas]
     
 #     # Verificação condicional para o Silhouette Score
 #     if num_anomalias > 0 and num_anomalias < len(df_sample):
-#         # Calculando o Silhouette Score com uma amostragem de 10% dos dados
-#         sample_size = 0.1
-#         df_sampled = df_sample.sample(frac=sample_size, random_state=42)
-#         silhouette_isoforest = silhouette_score(df_sampled[colunas_selecionadas], df_sampled['anomaly_isoforest'])
-#         print(f"Silhouette Score Isolation Forest (amostragem): {silhouette_isoforest:.4f}")
+#         # Silhueta em amostras estratificadas (normais e anomalias), com intervalo de confiança de 95%
+#         silhueta = sampled_silhouette(df_scaled, df_sample['anomaly_isoforest'])
+#         print(f"Silhouette Score Isolation Forest (amostragem): {silhueta['silhueta']:.4f} "
+#               f"(IC 95%: {silhueta['ic_inferior']:.4f} a {silhueta['ic_superior']:.4f})")
 #     else:
 #         print("Não foi possível calcular o Silhouette Score, pois não há uma separação adequada entre anomalias e normais.")
     
@@ -3016,17 +2960,12 @@ df_merged[colunas_selecionadas]
 # # #### 10.3.1.2 Criação de uma função única para as 3 métricas: CH Index, DBI e Silhueta
 
 # # %% [markdown]
-# # &nbsp;&nbsp;&nbsp;&nbsp;Após isso, é necessário que se escolha uma métrica que o algoritmo utilizará para decidir quais combinações de hiperparâmetros performou melhor. Desse modo, foi criada a função custom_scoring para que as 3 métricas utilizadas (coeficiente da silhueta, DBI e CH Index) pudessem ser utilizadas ao mesmo tempo pelo algoritmo de fine tuning.
+# # &nbsp;&nbsp;&nbsp;&nbsp;Após isso, é necessário que se escolha uma métrica que o algoritmo utilizará para decidir quais combinações de hiperparâmetros performou melhor. Como o coeficiente da silhueta tradicional cresce com o quadrado do número de linhas e seria recalculado em cada divisão da validação cruzada, foi utilizada a silhueta simplificada do módulo avaliacao, que compara cada ponto com os centróides dos grupos e é calculada em tempo linear. O estimador já treinado pela busca apenas prevê os rótulos, sem ser treinado novamente.
 
 # # %%
-# def custom_scoring(estimator, X):
-#     labels = estimator.fit_predict(X)
-#     sil_score = silhouette_score(X, labels)
-#     dbi_score = davies_bouldin_score(X, labels)
-#     ch_score = calinski_harabasz_score(X, labels)
-#     return sil_score
+# from avaliacao import silhouette_scorer
 
-# scorer = make_scorer(custom_scoring)
+# scorer = silhouette_scorer('simplificada')
 
 # # %% [markdown]
 # # #### 10.3.1.3 Definição do algoritmo de fine tuning
@@ -3337,7 +3276,8 @@ df_merged[colunas_selecionadas]
 #     'variação_consumo',
     
 # ]
-# df_amostra = df_amostra[colunas_selecionadas]
+# ## As colunas One Hot do perfil de consumo são geradas apenas na amostra
+# df_amostra = model_input(df_amostra, colunas_selecionadas)
 # df_amostra.head()
 
 # # %%
@@ -3349,7 +3289,7 @@ df_merged[colunas_selecionadas]
 
 # # Normalização das colunas selecionadas
 # scaler = StandardScaler()
-# X_train_scaled = scaler.fit_transform(df_amostra[colunas_selecionadas])
+# X_train_scaled = scaler.fit_transform(model_input(df_amostra, colunas_selecionadas))
 
 
 # # Modelo One-Class SVM
@@ -3677,7 +3617,7 @@ df_merged[colunas_selecionadas]
 
 # # Normalização das colunas selecionadas
 # scaler = StandardScaler()
-# X_train_scaled = scaler.fit_transform(df_amostra[colunas_selecionadas])
+# X_train_scaled = scaler.fit_transform(model_input(df_amostra, colunas_selecionadas))
 
 # # Modelo One-Clas SVM
 # model = OneClassSVM(kernel='rbf', gamma=0.001, nu=0.01)
@@ -3701,6 +3641,32 @@ df_merged[colunas_selecionadas]
 # silhouette_avg = silhouette_score(X_train_scaled, labels)
 # print(f'Silhouette Score: {silhouette_avg}')
 
+# # %% [markdown]
+# # ### 11.3.4. One-Class SVM aproximado na base inteira
+
+# # %% [markdown]
+# # &nbsp;&nbsp;&nbsp;&nbsp;O treino do One-Class SVM com kernel RBF cresce com o quadrado do número de linhas (ou mais), por isso o modelo acima foi treinado em apenas 1% dos dados. O modelo `ApproximateOneClassSVM`, do módulo svm_aproximado, aproxima o kernel RBF com o método de Nyström e treina um One-Class SVM linear (SGDOneClassSVM) em blocos de linhas, o que permite usar as cerca de 3 milhões de linhas em uma única passada. Ele possui a mesma interface (predict e decision_function) do modelo exato. Para validar a aproximação, os dois modelos são comparados na amostra: concordância dos rótulos, precisão e recall das anomalias e correlação entre as funções de decisão.
+
+# # %%
+# from codificacao import model_input
+# from svm_aproximado import ApproximateOneClassSVM, compare_with_exact
+
+# # Pipeline com os melhores hiperparâmetros, treinado na base inteira
+# pipeline_ocsvm_aproximado = Pipeline([
+#     ('scaler', StandardScaler()),
+#     ('oneclasssvm', ApproximateOneClassSVM(gamma=0.001, nu=0.01, n_components=300)),
+# ])
+# X_completo = model_input(df_merged, colunas_selecionadas)
+# df_merged['anomaly_ocsvm'] = (pipeline_ocsvm_aproximado.fit(X_completo).predict(X_completo) == -1).astype(np.uint8)
+# print(f"Anomalias detectadas na base inteira: {df_merged['anomaly_ocsvm'].sum()} de {len(df_merged)}")
+
+# # Comparação com o One-Class SVM exato na amostra (mesma padronização)
+# X_amostra = model_input(df_amostra, colunas_selecionadas)
+# X_amostra_scaled = pipeline_ocsvm_aproximado.named_steps['scaler'].transform(X_amostra)
+# relatorio = compare_with_exact(X_amostra_scaled, gamma=0.001, nu=0.01,
+#                                aproximado=pipeline_ocsvm_aproximado.named_steps['oneclasssvm'])
+# print(relatorio)
+
 # # %% [markdown]
 # # ## 11.4. Análise dos resultados do modelo One-Class SVM após fine tuning de hiperparâmetros
 
@@ -3954,7 +3920,7 @@ df_merged[colunas_selecionadas]
 
 # # %%
 # # Redução do modelo na variável df_sample2 para testagem do DBScan
-# df_sample2 = df_merged[colunas_selecionadas2].sample(frac=0.008, random_state=42).astype(int).copy() # 8% dos dados
+# df_sample2 = model_input(df_merged.sample(frac=0.008, random_state=42), colunas_selecionadas2).astype(int) # 8% dos dados
 
 # # %% [markdown]
 # # ##### 12.1.3 Programação do modelo
@@ -4008,37 +3974,38 @@ df_merged[colunas_selecionadas]
 # # ##### 12.1.4 Fine Tuning de hiperparâmetros com cálculo de Silhueta
 
 # # %% [markdown]
-# # &nbsp;&nbsp;&nbsp;&nbsp;Considerando-se que a alteração dos hiperparâmetros eps e min_samples interfere no sucesso do modelo, implementou-se um Fine Tuning para realizar várias combinações de valores, avaliando os melhores com o cálculo da Silhueta. Devido ao seu tempo de execução de cerca de 15 minutos, o código foi comentado para maior eficiência do notebook, mas caso deseje-se executá-lo, basta remover os comentários.
+# # &nbsp;&nbsp;&nbsp;&nbsp;Considerando-se que a alteração dos hiperparâmetros eps e min_samples interfere no sucesso do modelo, implementou-se um Fine Tuning para realizar várias combinações de valores, avaliando os melhores com o cálculo da Silhueta. Antes, cada combinação treinava o DBSCAN do zero e calculava a silhueta completa, o que levava cerca de 15 minutos em 0,8% dos dados. Com a função dbscan_sweep do módulo clusterizacao, os vizinhos de cada ponto são buscados uma única vez (com o maior eps) e reaproveitados em todas as combinações, e a silhueta é estimada em amostras estratificadas, o que permite usar amostras bem maiores. O gráfico k-distance também sugere um valor de eps pelo seu "joelho". O código continua comentado para maior eficiência do notebook, mas caso deseje-se executá-lo, basta remover os comentários.
 
 # # %%
 # """
+# from clusterizacao import dbscan_sweep, suggest_eps
+
+# # Sugestão de eps pelo joelho do gráfico k-distance (distância de cada ponto ao seu min_samples-ésimo vizinho)
+# eps_sugerido, curva_k_distance = suggest_eps(features_scaled, min_samples=50)
+# plt.figure(figsize=(10, 5))
+# plt.plot(curva_k_distance)
+# plt.axhline(eps_sugerido, color='red', linestyle='--', label=f'eps sugerido: {eps_sugerido:.2f}')
+# plt.title('Gráfico k-distance')
+# plt.xlabel('Pontos ordenados')
+# plt.ylabel('Distância ao k-ésimo vizinho')
+# plt.legend()
+# plt.show()
 
 # # Definição de intervalos de eps e min_samples para testagem
 # eps_values = np.arange(0.2, 1.0, 0.1)  # Testando valores entre 0.4 e 1.0, pulando de 0.1 em 0.1
 # min_samples_values = range(50, 150, 25)  # Testando valores de 50 a 150, pulando de 25 em 25
 
-# # Variáveis para guardar os melhores parâmetros
-# best_eps = None
-# best_min_samples = None
-# best_silhouette_score = -1 # menor valor possível para o best_silhouette_score
-# best_clusters = None
-
-# # Loop para testar todas as combinações de eps e min_samples
-# for eps in eps_values:
-#     for min_samples in min_samples_values:
-#         # Modelo DBSCAN com os parâmetros de cada instância
-#         dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-#         clusters = dbscan.fit_predict(features_scaled)
-        
-#         if len(set(clusters)) > 1:  # Garante que há mais de um cluster
-#             score = silhouette_score(features_scaled, clusters)
-            
-#             # Verificação se o score atual é o melhor
-#             if score > best_silhouette_score:
-#                 best_silhouette_score = score
-#                 best_eps = eps
-#                 best_min_samples = min_samples
-#                 best_clusters = clusters
+# # Todas as combinações a partir de um único grafo de vizinhança
+# resultados_dbscan, best_clusters = dbscan_sweep(features_scaled, eps_values, min_samples_values)
+# print(resultados_dbscan.head(10))
+
+# # Melhores parâmetros (maior silhueta), apenas entre as combinações que geraram mais de um grupo
+# validos = resultados_dbscan.dropna(subset=['silhueta'])
+# if validos.empty:
+#     raise ValueError("Nenhuma combinação de eps e min_samples gerou mais de um grupo. Amplie os intervalos testados.")
+# best_eps = validos.iloc[0]['eps']
+# best_min_samples = int(validos.iloc[0]['min_samples'])
+# best_silhouette_score = validos.iloc[0]['silhueta']
 
 # # Aplicar os melhores parâmetros encontrados ao DataFrame original
 # df_sample2['cluster'] = best_clusters
@@ -4076,46 +4043,42 @@ df_merged[colunas_selecionadas]
 # # %%
 # """
 
-# from sklearn.metrics import davies_bouldin_score, calinski_harabasz_score
+# from clusterizacao import dbscan_sweep
 
 # # Definição de intervalos de eps e min_samples para testagem
 # eps_values = np.arange(0.2, 1.0, 0.1)  # Testar valores entre 0.2 e 1.0, variando de 0.1 a 0.1
 # min_samples_values = range(50, 150, 25)  # Testar valores de 50 a 150, variando de 25 a 25
 
+# # Silhueta amostrada, DBI e CH Index de todas as combinações, a partir de um único grafo de vizinhança
+# resultados_dbscan, _ = dbscan_sweep(features_scaled, eps_values, min_samples_values)
+# validos = resultados_dbscan.dropna(subset=['silhueta'])
+# if validos.empty:
+#     raise ValueError("Nenhuma combinação de eps e min_samples gerou mais de um grupo. Amplie os intervalos testados.")
+
 # # Variáveis para guardar os melhores parâmetros
 # best_eps = None
 # best_min_samples = None
 # best_silhouette_score = -1
 # best_dbi = float('inf')  # Para DBI, menor é melhor, então inicializamos com infinito
 # best_ch = -1  # Para CH, maior é melhor, então inicializamos com -1
-# best_clusters = None
-
-# # Loop para testar todas as combinações de eps e min_samples
-# for eps in eps_values:
-#     for min_samples in min_samples_values:
-#         # Modelo DBSCAN com os parâmetros atuais
-#         dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-#         clusters = dbscan.fit_predict(features_scaled)
-        
-#         if len(set(clusters)) > 1:  # Garantir que há mais de um cluster
-            
-#             # Silhouette Score
-#             sil_score = silhouette_score(features_scaled, clusters)
-            
-#             # Davies-Bouldin Index (DBI)
-#             dbi = davies_bouldin_score(features_scaled, clusters)
-            
-#             # Calinski-Harabasz Index (CH Index)
-#             ch = calinski_harabasz_score(features_scaled, clusters)
-            
-#             # Verifica se este é o melhor conjunto de métricas até agora
-#             if (sil_score > best_silhouette_score and dbi < best_dbi and ch > best_ch):
-#                 best_silhouette_score = sil_score
-#                 best_dbi = dbi
-#                 best_ch = ch
-#                 best_eps = eps
-#                 best_min_samples = min_samples
-#                 best_clusters = clusters
+
+# # Mesmo critério de antes, na mesma ordem de eps e min_samples: a combinação só é aceita se as 3 métricas melhorarem
+# for linha in validos.sort_values(['eps', 'min_samples']).itertuples():
+#     if (linha.silhueta > best_silhouette_score and linha.davies_bouldin < best_dbi and linha.calinski_harabasz > best_ch):
+#         best_silhouette_score = linha.silhueta
+#         best_dbi = linha.davies_bouldin
+#         best_ch = linha.calinski_harabasz
+#         best_eps = linha.eps
+#         best_min_samples = int(linha.min_samples)
+
+# # Se nenhuma combinação melhorar as 3 métricas, usa a de maior silhueta
+# if best_eps is None:
+#     melhor = validos.iloc[0]
+#     best_eps, best_min_samples = melhor['eps'], int(melhor['min_samples'])
+#     best_silhouette_score, best_dbi, best_ch = melhor['silhueta'], melhor['davies_bouldin'], melhor['calinski_harabasz']
+
+# # Rótulos apenas da combinação escolhida
+# best_clusters = DBSCAN(eps=best_eps, min_samples=best_min_samples).fit_predict(features_scaled)
 
 # # Aplica os melhores parâmetros encontrados ao DataFrame df_sample2
 # df_sample2['cluster'] = best_clusters
@@ -4294,35 +4257,23 @@ df_merged[colunas_selecionadas]
 # # &nbsp;&nbsp;&nbsp;&nbsp;Para esta abordagem, utilizaremos o método de GridSearch para encontrar a melhor combinação de valores de hiperparâmetros. O GridSearch é um algoritmo que testa todas as combinações de hiperparâmetros e retorna aquela que possua melhores resultados. Para esta análise, será utilizado como métrica de eficiência do modelo e comparação entre hiperparâmetros o Davies-Bouldin Score, que mede a qualidade dos clusters gerados pelo modelo, baseando-se na similaridade média entre os clusters e na sua separação.
 
 # # %%
-# # #from sklearn.metrics import davies_bouldin_score
+# # from clusterizacao import optics_sweep
 
 # # # Defina a grade de hiperparâmetros
-# # # param_grid = {
+# # param_grid = {
 # #     'min_samples': [5, 10, 20, 50],
 # #     'xi': [0.05, 0.1, 0.2],
 # #     'min_cluster_size': [0.05, 0.1, 0.2]
 # # }
 
-# # best_score = np.inf  # Comece com um valor alto para o Davies-Bouldin, já que menor é melhor
-# # best_params = {}
-
-# # # Loop manual pelos hiperparâmetros
-# # for min_samples in param_grid['min_samples']:
-# #     for xi in param_grid['xi']:
-# #         for min_cluster_size in param_grid['min_cluster_size']:
-# #             # Treina o modelo OPTICS com cada combinação de hiperparâmetros
-# #             optics = OPTICS(min_samples=min_samples, xi=xi, min_cluster_size=min_cluster_size)
-# #             optics.fit(X)
-
-# #             # Apenas avalie se há mais de um cluster identificado
-# #             if len(np.unique(optics.labels_)) > 1:
-# #                 score = davies_bouldin_score(X, optics.labels_)
-# #                 print(f"Parâmetros: min_samples={min_samples}, xi={xi}, min_cluster_size={min_cluster_size}, Score: {score}")
+# # # Um único treino por min_samples (4 em vez de 36): xi e min_cluster_size só alteram a extração dos clusters
+# # resultados_optics, modelos_optics = optics_sweep(X, param_grid['min_samples'], param_grid['xi'], param_grid['min_cluster_size'])
+# # print(resultados_optics)
 
-# #                 # Atualiza se o score for melhor
-# #                 if score < best_score:
-# #                     best_score = score
-# #                     best_params = {'min_samples': min_samples, 'xi': xi, 'min_cluster_size': min_cluster_size}
+# # # Melhor combinação pelo Davies-Bouldin (menor é melhor)
+# # melhor = resultados_optics.dropna(subset=['davies_bouldin']).iloc[0]
+# # best_score = melhor['davies_bouldin']
+# # best_params = {'min_samples': int(melhor['min_samples']), 'xi': melhor['xi'], 'min_cluster_size': melhor['min_cluster_size']}
 
 # # # Exibe os melhores parâmetros e o melhor score
 # # print("Melhores hiperparâmetros:", best_params)
@@ -4330,7 +4281,7 @@ df_merged[colunas_selecionadas]
 
 
 # # %% [markdown]
-# # &nbsp;&nbsp;&nbsp;&nbsp;Aqui, o código foi comentado por conta do tempo de execução. Caso queira rodar novamente para outros dados ou semelhante, basta descomentar toda a célular e rodar novamente.
+# # &nbsp;&nbsp;&nbsp;&nbsp;Como apenas o min_samples altera a ordenação e as distâncias de alcançabilidade calculadas pelo OPTICS, a função optics_sweep treina um modelo por valor de min_samples e, para cada xi e min_cluster_size, refaz somente a extração dos clusters (cluster_optics_xi), reduzindo de 36 para 4 os treinos do modelo. Aqui, o código foi comentado por conta do tempo de execução. Caso queira rodar novamente para outros dados ou semelhante, basta descomentar toda a célular e rodar novamente.
 
 # # %% [markdown]
 # # &nbsp;&nbsp;&nbsp;&nbsp;Ao rodar o algoritmo de GridSearch acima, foi retornada a seguinte melhor combinação de hiperparâmetros: 
@@ -4501,16 +4452,19 @@ df_merged[colunas_selecionadas]
 # df_sintetico['dia_da_semana'] = df_sintetico['data_hora'].dt.dayofweek
 
 # # %% [markdown]
-# # Calculo de médias móveis do consumo diário em diferentes janelas (7 e 30 dias) para capturar tendências
+# # Calculo de médias móveis do consumo diário em diferentes janelas (7 e 30 dias) para capturar tendências. <br>
+# # As janelas são calculadas por instalação (clientCode + clientIndex): o dataset é ordenado uma única vez por instalação e data, e nenhuma janela mistura os dados de duas instalações. Novas janelas ou estatísticas (desvio, mínimo, máximo e média exponencial) podem ser adicionadas nos parâmetros.
 
 # # %%
 # df_sintetico['ano_mes'] = df_sintetico['data_hora'].dt.to_period('M')
 
 # # %%
-# df_sintetico['media_movel_7_dias'] = df_sintetico['consumo_dia'].rolling(window=7).mean()
-# df_sintetico['media_movel_30_dias'] = df_sintetico['consumo_dia'].rolling(window=30).mean()
-# df_sintetico['media_movel_30_dias'] = df_sintetico['media_movel_30_dias'].fillna(0) ## Dados que não possuem uma janela de 30 dias
-# df_sintetico['media_movel_7_dias'] = df_sintetico['media_movel_7_dias'].fillna(0) ## Dados que não possuem uma janela de 7 dias
+# from instalacoes import build_installation_index, compute_rolling_features, compute_pct_change
+
+# df_sintetico, indice_sintetico = build_installation_index(df_sintetico, tempo='data_hora')
+
+# ## Dados que não possuem uma janela de 7 ou 30 dias recebem 0
+# df_sintetico = compute_rolling_features(df_sintetico, indice_sintetico, coluna='consumo_dia', janelas=[7, 30], estatisticas=['mean'], preencher=0)
 
 # # %% [markdown]
 # # Cálculo de consumo mensal dos clientes
@@ -4574,8 +4528,13 @@ df_merged[colunas_selecionadas]
 # # %%
 # estacao_para_trig('Primavera')
 
+# # %% [markdown]
+# # As funções acima documentam a regra das estações. Para as milhões de linhas diárias, a estação, a sua codificação cíclica (estacao_cos e estacao_sin), o mês, o dia da semana e os feriados nacionais (fixos e móveis, calculados a partir da Páscoa) são obtidos pelo módulo `calendario.py`, compartilhado com a dashboard, por consulta em tabelas indexadas por mês e dia, sem chamar uma função Python por linha.
+
 # # %%
-# df_sintetico['estacao'] = df_sintetico['data_hora'].apply(obter_estacao)
+# from calendario import add_calendar_features
+
+# df_sintetico = add_calendar_features(df_sintetico, coluna='data_hora')
 
 # # %%
 # df_sintetico['estacao'].value_counts()
@@ -4584,7 +4543,7 @@ df_merged[colunas_selecionadas]
 # # Calculo de média de consumo por estação do ano
 
 # # %%
-# media_consumo_por_estacao = df_sintetico.groupby('estacao')['consumo_dia'].mean().sort_index()
+# media_consumo_por_estacao = df_sintetico.groupby('estacao', observed=True)['consumo_dia'].mean().sort_index()
 
 # print(media_consumo_por_estacao)
 
@@ -4608,7 +4567,8 @@ df_merged[colunas_selecionadas]
 # # Calculo de mudanças percentuais no consumo entre períodos para detectar tendências de aumento ou diminuição. Além disso, pode ser úteis para identificar tendências sazonais
 
 # # %%
-# df_sintetico['mudanca_percentual'] = df_sintetico.groupby(['clientCode'])['consumo_dia'].pct_change()
+# ## Mudança em relação ao dia anterior da mesma instalação (clientCode + clientIndex)
+# df_sintetico['mudanca_percentual'] = compute_pct_change(df_sintetico, indice_sintetico, coluna='consumo_dia')
 
 # # %%
 # df_sintetico['mudanca_percentual']
@@ -4872,48 +4832,20 @@ df_merged[colunas_selecionadas]
 # # &nbsp;&nbsp;&nbsp;&nbsp;Aqui, rodamos vários loops para testar todas as combinações possíveis de parâmetros. A cada iteração, é calculado o erro médio, quadrático e percentual. Ao final, é recomendada a combinação de valores que resultou nos menores erros.
 
 # # %%
-# for trend in trend_options:
-#     for seasonal in seasonal_options:
-#         for period in seasonal_periods:
-#             for damped in damped_trend_options:
-#                 try:
-#                     ## Apenas testar damped_trend se houver uma tendência
-#                     if trend is None and damped:
-#                         continue
-                    
-#                     ## Definir e ajustar o modelo Holt-Winters com os dados de treino
-#                     modelo_treino = ExponentialSmoothing(
-#                         train['consumo_dia'], 
-#                         trend=trend, 
-#                         seasonal=seasonal,
-#                         seasonal_periods=period,
-#                         damped_trend=damped
-#                     )
-
-#                     ajuste_treino = modelo_treino.fit()
-
-#                     ## Fazer a previsão para o número de meses no conjunto de teste
-#                     previsao_teste = ajuste_treino.forecast(len(test))
-
-#                     ## Calcular as métricas
-#                     mae = mean_absolute_error(test['consumo_dia'], previsao_teste)
-#                     mse = mean_squared_error(test['consumo_dia'], previsao_teste)
-#                     mape = mean_absolute_percentage_error(test['consumo_dia'], previsao_teste)
-
-#                     ## Comparar o erro e armazenar o melhor modelo (baseado no MAE)
-#                     if mae < best_mae:
-#                         best_mae = mae
-#                         best_mse = mse
-#                         best_mape = mape
-#                         best_params = {
-#                             'trend': trend,
-#                             'seasonal': seasonal,
-#                             'seasonal_periods': period,
-#                             'damped_trend': damped
-#                         }
-
-#                 except Exception as e:
-#                     print(f"Erro com a configuração {trend}, {seasonal}, {period}, damped={damped}: {e}")
+# ## O Grid Search é feito pelo mesmo motor utilizado na dashboard, que distribui os ajustes entre os núcleos da máquina
+# from previsao import generate_candidates, search_best_params
+
+# candidatos = generate_candidates(trend_options, seasonal_options, seasonal_periods, damped_trend_options)
+# resultado_busca = search_best_params(train, test, n_jobs=-1, candidatos=candidatos)
+
+# best_params = resultado_busca['best_params']
+# best_mae = resultado_busca['mae']
+# best_mse = resultado_busca['mse']
+# best_mape = resultado_busca['mape']
+
+# ## Combinações impossíveis (séries curtas, valores não positivos com 'mul', períodos redundantes) não são ajustadas
+# print(f"Ajustes realizados: {resultado_busca['ajustes_realizados']}, ajustes pulados: {resultado_busca['ajustes_pulados']}")
+# print(resultado_busca['descartados'])
 
 # # %%
 # ## Exibir os melhores parâmetros e métricas
@@ -5046,6 +4978,9 @@ colunas_selecionadas = [
 ]
 
 # %%
+# from avaliacao import sampled_silhouette, simplified_silhouette
+# from ajuste_hiperparametros import ISOLATION_FOREST_GRID, halving_results, isolation_forest_halving_search
+
 # def validar_dados(df, colunas):
 #     if df.empty:
 #         raise ValueError("O DataFrame está vazio.")
@@ -5053,54 +4988,30 @@ colunas_selecionadas = [
 #         raise ValueError("Uma ou mais colunas selecionadas não estão presentes no DataFrame.")
 #     return True
 
-# # Validação dos dados
-# validar_dados(df_merged, colunas_selecionadas)
+# # Validação dos dados (as colunas One Hot de perfil_consumo são geradas aqui, em uint8)
+# X_modelo = model_input(df_merged, colunas_selecionadas)
+# validar_dados(X_modelo, colunas_selecionadas)
 
 # # Pré-processamento dos dados
 # scaler = StandardScaler()
-# df_scaled = scaler.fit_transform(df_merged[colunas_selecionadas])
-
-# # Definindo a grade de hiperparâmetros
-# param_grid = {
-#     'n_estimators': [100, 150, 200],
-#     'max_samples': [0.8, 1.0],
-#     'max_features': [0.8, 1.0],
-#     'contamination': [0.05, 0.1, 'auto'],
-#     'bootstrap': [False, True]
-# }
-
-# # Definindo o Isolation Forest
-# iso_forest = IsolationForest(random_state=42)
-
-# # Função customizada de pontuação usando o Silhouette Score
-# def custom_scorer(estimator, X):
-#     # Prevendo rótulos de anomalias (-1 para anomalia, 1 para normal)
-#     labels = estimator.fit_predict(X)
-#     labels = np.where(labels == 1, 0, 1)  # Convertendo para 0 (normal) e 1 (anomalia)
-    
-#     # Calculando Silhouette Score (usando labels como clusters)
-#     if len(np.unique(labels)) > 1:  # Garantindo que há mais de um cluster
-#         return silhouette_score(X, labels)
-#     else:
-#         return -1  # Retornando valor negativo para não penalizar quando não houver separação
+# df_scaled = scaler.fit_transform(X_modelo)
 
-# # Criando o scorer
-# scorer = make_scorer(custom_scorer, greater_is_better=True, needs_proba=False)
-
-# # Configurando o GridSearchCV
-# grid_search = GridSearchCV(iso_forest, param_grid, cv=3, verbose=3, scoring=scorer)
+# # Grade de hiperparâmetros (n_estimators x max_samples x max_features x contamination x bootstrap = 72 combinações)
+# param_grid = ISOLATION_FOREST_GRID
 
 # try:
-#     # Executando o GridSearchCV para encontrar os melhores hiperparâmetros
-#     grid_search.fit(df_scaled)
+#     # Successive halving: as 72 combinações são avaliadas em subamostras pequenas e apenas o terço
+#     # com maior silhueta simplificada passa para a rodada seguinte, com o triplo de linhas
+#     halving_search = isolation_forest_halving_search(df_scaled, param_grid, n_jobs=-1)
+#     print(halving_results(halving_search).head(10))
 
 #     # Extraindo os melhores hiperparâmetros
-#     best_params = grid_search.best_params_
-#     print(f"Melhores parâmetros: {grid_search.best_params_}")
-#     print(f"Melhor score: {grid_search.best_score_}")
+#     best_params = halving_search.best_params_
+#     print(f"Melhores parâmetros: {halving_search.best_params_}")
+#     print(f"Melhor score: {halving_search.best_score_}")
     
-#     # Treinando o modelo final com os melhores hiperparâmetros
-#     best_iso_forest = grid_search.best_estimator_
+#     # Treinando o modelo final com os melhores hiperparâmetros (único treino sobre a base inteira)
+#     best_iso_forest = IsolationForest(**best_params, random_state=42)
     
 #     # Detectando anomalias
 #     df_merged['anomaly_isoforest'] = best_iso_forest.fit_predict(df_scaled)
@@ -5120,8 +5031,10 @@ colunas_selecionadas = [
     
 #     # Verificação condicional para o Silhouette Score
 #     if num_anomalias > 0 and num_anomalias < len(df_merged):
-#         silhouette_isoforest = silhouette_score(df_scaled, df_merged['anomaly_isoforest'])
-#         print(f"Silhouette Score Isolation Forest (amostragem): {silhouette_isoforest:.4f}")
+#         silhueta = sampled_silhouette(df_scaled, df_merged['anomaly_isoforest'])
+#         print(f"Silhouette Score Isolation Forest (amostragem): {silhueta['silhueta']:.4f} "
+#               f"(IC 95%: {silhueta['ic_inferior']:.4f} a {silhueta['ic_superior']:.4f})")
+#         print(f"Silhouette Score simplificado Isolation Forest: {simplified_silhouette(df_scaled, df_merged['anomaly_isoforest']):.4f}")
 #     else:
 #         print("Não foi possível calcular o Silhouette Score, pois não há uma separação adequada entre anomalias e normais.")
     
@@ -5141,13 +5054,13 @@ def validar_dados(df, colunas):
         raise ValueError("Uma ou mais colunas selecionadas não estão presentes no DataFrame.")
     return True
 
-# Validação dos dados
-validar_dados(df_merged, colunas_selecionadas)
+# Validação dos dados (as colunas One Hot de perfil_consumo são geradas aqui, em uint8)
+X_modelo = model_input(df_merged, colunas_selecionadas)
+validar_dados(X_modelo, colunas_selecionadas)
 
-# Pré-processamento dos dados
-scaler = StandardScaler()
-df_scaled = scaler.fit_transform(df_merged[colunas_selecionadas])
 
+# %% [markdown]
+# &nbsp;&nbsp;&nbsp;&nbsp;Os hiperparâmetros abaixo foram obtidos pela busca da célula anterior. Com o successive halving (módulo ajuste_hiperparametros), a busca pode ser refeita em uma fração do tempo da busca em grade completa, pois a maior parte das combinações é descartada ainda nas subamostras pequenas.
 
 # %%
 params = {
@@ -5158,11 +5071,15 @@ params = {
     'n_estimators': 100     # Número de árvores
 }
 
-# Criando o modelo Isolation Forest
-iso_forest_final = IsolationForest(**params, random_state=42)
+# Criando o pipeline de inferência: o scaler de treino é salvo junto com o Isolation Forest,
+# para que a dashboard aplique exatamente a mesma padronização nos arquivos carregados
+pipeline_iso_forest = Pipeline([
+    ('scaler', StandardScaler()),
+    ('iso_forest', IsolationForest(**params, random_state=42)),
+])
 
 # Treinando e fazendo a previsão ao mesmo tempo com fit_predict
-df_merged['anomaly_isoforest'] = iso_forest_final.fit_predict(df_scaled)
+df_merged['anomaly_isoforest'] = pipeline_iso_forest.fit_predict(X_modelo)
 
 # Mapeando 1 para normal e -1 para anomalia
 df_merged['anomaly_isoforest'] = df_merged['anomaly_isoforest'].map({1: 0, -1: 1})  # 0 para normal, 1 para anomalia
@@ -5171,6 +5088,17 @@ df_merged['anomaly_isoforest'] = df_merged['anomaly_isoforest'].map({1: 0, -1: 1
 num_anomalias = df_merged['anomaly_isoforest'].sum()
 print(f"Número de anomalias detectadas: {num_anomalias} de {len(df_merged)} amostras.")
 
+# %%
+from avaliacao import sampled_silhouette, simplified_silhouette
+
+# Silhueta sobre a base inteira: simplificada (centróides) e estimada em amostras estratificadas
+X_padronizado = pipeline_iso_forest.named_steps['scaler'].transform(X_modelo)
+print(f"Silhouette Score simplificado: {simplified_silhouette(X_padronizado, df_merged['anomaly_isoforest']):.4f}")
+
+silhueta = sampled_silhouette(X_padronizado, df_merged['anomaly_isoforest'])
+print(f"Silhouette Score (amostragem estratificada): {silhueta['silhueta']:.4f} "
+      f"(IC 95%: {silhueta['ic_inferior']:.4f} a {silhueta['ic_superior']:.4f})")
+
 # %%
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -5191,6 +5119,9 @@ plt.show()
 # %%
 import joblib
 
+# Exporta o pipeline (scaler + Isolation Forest + colunas de treino) para a dashboard
+joblib.dump(pipeline_iso_forest, '../documents/extras/dashboard/iso_forest_pipeline.pkl')
+
 # iso_forest = joblib.load('best_isolation_forest_model.joblib')
 
 # %% [markdown]
@@ -0,0 +1,253 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import joblib
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from sklearn.metrics import mean_absolute_error, mean_squared_error, mean_absolute_percentage_error
+
+
+# Parâmetros a serem testados no Grid Search do Holt-Winters
+TREND_OPTIONS = ['add', 'mul', None]
+SEASONAL_OPTIONS = ['add', 'mul', None]
+SEASONAL_PERIODS = [i for i in range(2, 31)]
+DAMPED_TREND_OPTIONS = [True, False]
+
+CACHE_PATH = 'cache_holt_winters.joblib'
+CACHE_MAX_ENTRIES = 64
+
+
+def split_train_test(instalacao_mensal_df, train_frac=0.8):
+    """Divide a série mensal em treino (80%) e teste (20%)."""
+    train_size = int(len(instalacao_mensal_df) * train_frac)
+    return instalacao_mensal_df.iloc[:train_size], instalacao_mensal_df.iloc[train_size:]
+
+
+def generate_candidates(trend_options=TREND_OPTIONS, seasonal_options=SEASONAL_OPTIONS,
+                        seasonal_periods=SEASONAL_PERIODS, damped_trend_options=DAMPED_TREND_OPTIONS):
+    """Gera as combinações de hiperparâmetros na mesma ordem do Grid Search manual."""
+    candidatos = []
+    for trend in trend_options:
+        for seasonal in seasonal_options:
+            for period in seasonal_periods:
+                for damped in damped_trend_options:
+                    ## Apenas testar damped_trend se houver uma tendência
+                    if trend is None and damped:
+                        continue
+                    candidatos.append({
+                        'trend': trend,
+                        'seasonal': seasonal,
+                        'seasonal_periods': period,
+                        'damped_trend': damped
+                    })
+    return candidatos
+
+
+def plan_candidates(train_serie, candidatos=None):
+    """
+    Remove da grade as combinações que não podem (ou não precisam) ser ajustadas:
+    - sazonalidade None: o seasonal_periods é ignorado, então basta o primeiro período;
+    - tendência ou sazonalidade multiplicativa em séries com valores <= 0;
+    - sazonalidade com menos de dois ciclos completos nos dados de treino.
+    Retorna os candidatos válidos e a contagem de ajustes pulados por motivo.
+    """
+    if candidatos is None:
+        candidatos = generate_candidates()
+
+    nobs = len(train_serie)
+    serie_positiva = bool((train_serie > 0).all())
+
+    validos = []
+    periodos_vistos = set()
+    descartados = {'periodo_redundante': 0, 'serie_nao_positiva': 0, 'serie_curta': 0}
+
+    for params in candidatos:
+        if params['seasonal'] is None:
+            chave = (params['trend'], params['damped_trend'])
+            if chave in periodos_vistos:
+                descartados['periodo_redundante'] += 1
+                continue
+            periodos_vistos.add(chave)
+
+        if not serie_positiva and 'mul' in (params['trend'], params['seasonal']):
+            descartados['serie_nao_positiva'] += 1
+            continue
+
+        if params['seasonal'] is not None and nobs < 2 * params['seasonal_periods']:
+            descartados['serie_curta'] += 1
+            continue
+
+        validos.append(params)
+
+    return validos, descartados
+
+
+def evaluate_candidate(train_serie, test_serie, params):
+    """
+    Ajusta um candidato com os dados de treino e calcula as métricas no teste.
+    Retorna None quando o ajuste falha, para que o candidato seja descartado.
+    """
+    try:
+        modelo_treino = ExponentialSmoothing(train_serie, **params)
+        ajuste_treino = modelo_treino.fit()
+        previsao_teste = ajuste_treino.forecast(len(test_serie))
+
+        mae = mean_absolute_error(test_serie, previsao_teste)
+        mse = mean_squared_error(test_serie, previsao_teste)
+        mape = mean_absolute_percentage_error(test_serie, previsao_teste)
+        return mae, mse, mape
+
+    except Exception as e:
+        print(f"Erro com a configuração {params['trend']}, {params['seasonal']}, {params['seasonal_periods']}, damped={params['damped_trend']}: {e}")
+        return None
+
+
+def _resolve_n_jobs(n_jobs):
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def search_best_params(train, test, coluna='consumo_dia', n_jobs=-1, candidatos=None):
+    """
+    Grid Search dos hiperparâmetros do Holt-Winters, distribuindo os ajustes entre processos.
+    n_jobs segue a convenção do sklearn (-1 usa todos os núcleos, 1 roda sem pool de processos).
+    Antes dos ajustes, a grade passa por plan_candidates e os candidatos inválidos são pulados.
+    Em caso de empate no MAE vence o candidato que aparece primeiro na grade, como no loop original.
+    """
+    train_serie = train[coluna]
+    test_serie = test[coluna]
+    candidatos, descartados = plan_candidates(train_serie, candidatos)
+    n_jobs = _resolve_n_jobs(n_jobs)
+
+    if n_jobs == 1 or len(candidatos) <= 1:
+        metricas = [evaluate_candidate(train_serie, test_serie, params) for params in candidatos]
+    else:
+        chunksize = max(1, len(candidatos) // (n_jobs * 4))
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            metricas = list(executor.map(
+                partial(evaluate_candidate, train_serie, test_serie), candidatos, chunksize=chunksize
+            ))
+
+    best_mae = np.inf
+    best_mse = np.inf
+    best_mape = np.inf
+    best_params = {}
+
+    ## Comparar o erro e armazenar o melhor modelo (baseado no MAE), percorrendo na ordem da grade
+    for params, resultado in zip(candidatos, metricas):
+        if resultado is None:
+            continue
+        mae, mse, mape = resultado
+        if mae < best_mae:
+            best_mae = mae
+            best_mse = mse
+            best_mape = mape
+            best_params = dict(params)
+
+    return {
+        'best_params': best_params,
+        'mae': best_mae,
+        'mse': best_mse,
+        'mape': best_mape,
+        'ajustes_realizados': len(candidatos),
+        'ajustes_pulados': sum(descartados.values()),
+        'descartados': descartados,
+    }
+
+
+def fit_best_model(instalacao_mensal_df, best_params, coluna='consumo_dia'):
+    """Ajusta o Holt-Winters com os melhores parâmetros sobre a série completa."""
+    modelo = ExponentialSmoothing(
+        instalacao_mensal_df[coluna],
+        trend=best_params['trend'],
+        seasonal=best_params['seasonal'],
+        seasonal_periods=best_params['seasonal_periods'],
+        damped_trend=best_params['damped_trend']
+    )
+    return modelo.fit()
+
+
+def fingerprint_series(serie):
+    """Gera um hash da série (índice + valores) para invalidar o cache quando os dados mudarem."""
+    hashes = pd.util.hash_pandas_object(serie, index=True).values
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+class HoltWintersCache:
+    """
+    Cache LRU dos melhores parâmetros e modelos ajustados por instalação, persistido em disco.
+    A chave é (clientCode_encoded, clientIndex, fingerprint da série mensal).
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._load()
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            self._entries = OrderedDict(joblib.load(self.path))
+        except Exception as e:
+            print(f"Não foi possível carregar o cache {self.path}: {e}")
+            self._entries = OrderedDict()
+        ## O arquivo pode ter sido salvo com um limite maior: descarta as entradas usadas há mais tempo
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self):
+        if self.path is None:
+            return
+        ## Escreve em um arquivo temporário e troca, para não corromper o cache em caso de erro
+        tmp_path = f"{self.path}.tmp"
+        joblib.dump(list(self._entries.items()), tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_or_fit(cache, client_code, client_index, instalacao_mensal_df, coluna='consumo_dia', n_jobs=-1):
+    """
+    Retorna o resultado da busca e o modelo ajustado da instalação, usando o cache quando possível.
+    Só roda o Grid Search quando a instalação (ou os seus dados) ainda não estão no cache.
+    """
+    key = (int(client_code), int(client_index), fingerprint_series(instalacao_mensal_df[coluna]))
+
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    train, test = split_train_test(instalacao_mensal_df)
+    resultado = search_best_params(train, test, coluna, n_jobs=n_jobs)
+    ajuste = fit_best_model(instalacao_mensal_df, resultado['best_params'], coluna)
+
+    entry = dict(resultado, ajuste=ajuste)
+    cache.put(key, entry)
+    return entry
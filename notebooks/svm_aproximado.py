@@ -0,0 +1,121 @@
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.base import BaseEstimator, OutlierMixin
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDOneClassSVM
+from sklearn.svm import OneClassSVM
+
+
+# Número de componentes do mapeamento aproximado do kernel RBF e linhas por bloco no treino em streaming
+N_COMPONENTS = 300
+CHUNK_SIZE = 100_000
+NYSTROEM_SAMPLE_SIZE = 10_000
+
+
+class ApproximateOneClassSVM(BaseEstimator, OutlierMixin):
+    """
+    One-Class SVM com kernel RBF aproximado: os dados passam por um mapeamento de dimensão fixa
+    (Nyström ou random Fourier features) e um One-Class SVM linear (SGDOneClassSVM) é treinado sobre ele
+    em blocos de linhas (partial_fit), em uma ou poucas passadas sobre a base inteira.
+    O custo é linear no número de linhas, em vez de quadrático como no OneClassSVM exato.
+    Tem a mesma interface do OneClassSVM: fit, predict (1 normal, -1 anomalia), decision_function e score_samples.
+    """
+
+    def __init__(self, gamma=0.001, nu=0.01, n_components=N_COMPONENTS, aproximacao='nystroem', n_passadas=1,
+                 tamanho_bloco=CHUNK_SIZE, random_state=42):
+        self.gamma = gamma
+        self.nu = nu
+        self.n_components = n_components
+        self.aproximacao = aproximacao
+        self.n_passadas = n_passadas
+        self.tamanho_bloco = tamanho_bloco
+        self.random_state = random_state
+
+    def _feature_map(self, X, rng):
+        if self.aproximacao == 'nystroem':
+            ## Os pontos de referência do Nyström são sorteados de uma amostra da base
+            amostra = X[rng.choice(len(X), size=min(NYSTROEM_SAMPLE_SIZE, len(X)), replace=False)]
+            mapa = Nystroem(kernel='rbf', gamma=self.gamma, n_components=min(self.n_components, len(amostra)),
+                            random_state=self.random_state)
+            return mapa.fit(amostra)
+        if self.aproximacao == 'rff':
+            return RBFSampler(gamma=self.gamma, n_components=self.n_components, random_state=self.random_state).fit(X[:1])
+        raise ValueError(f"Aproximação desconhecida: {self.aproximacao}. Use 'nystroem' ou 'rff'.")
+
+    def _chunks(self, X, ordem=None):
+        inicios = np.arange(0, len(X), self.tamanho_bloco)
+        if ordem is not None:
+            inicios = inicios[ordem]
+        for inicio in inicios:
+            yield inicio, self.feature_map_.transform(X[inicio:inicio + self.tamanho_bloco])
+
+    def fit(self, X, y=None):
+        X = np.asarray(X, dtype=np.float64)
+        rng = np.random.default_rng(self.random_state)
+
+        self.feature_map_ = self._feature_map(X, rng)
+        self.svm_ = SGDOneClassSVM(nu=self.nu, random_state=self.random_state)
+
+        n_blocos = int(np.ceil(len(X) / self.tamanho_bloco))
+        for _ in range(self.n_passadas):
+            ## Blocos em ordem aleatória, pois a base está ordenada por instalação
+            for _, bloco in self._chunks(X, ordem=rng.permutation(n_blocos)):
+                self.svm_.partial_fit(bloco)
+        return self
+
+    def decision_function(self, X):
+        """Distância com sinal à fronteira (positiva para normais, negativa para anomalias), calculada em blocos."""
+        X = np.asarray(X, dtype=np.float64)
+        resultado = np.empty(len(X), dtype=np.float64)
+        for inicio, bloco in self._chunks(X):
+            resultado[inicio:inicio + len(bloco)] = self.svm_.decision_function(bloco)
+        return resultado
+
+    def score_samples(self, X):
+        return self.decision_function(X) + self.svm_.offset_[0]
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) >= 0, 1, -1)
+
+
+def compare_with_exact(X, gamma=0.001, nu=0.01, aproximado=None, **kwargs):
+    """
+    Compara, em uma amostra X (já padronizada), o One-Class SVM exato com o aproximado.
+    aproximado pode ser um modelo já treinado (por exemplo, na base inteira); se None, é treinado em X.
+    Retorna uma Series com os tempos, a taxa de anomalias de cada modelo, a concordância dos rótulos,
+    a precisão e o recall das anomalias do aproximado em relação ao exato e a correlação de Spearman
+    entre as funções de decisão.
+    """
+    X = np.asarray(X, dtype=np.float64)
+
+    inicio = time.time()
+    exato = OneClassSVM(kernel='rbf', gamma=gamma, nu=nu).fit(X)
+    tempo_exato = time.time() - inicio
+
+    ## O tempo do aproximado só é medido quando ele é treinado aqui, na mesma amostra
+    tempo_aproximado = np.nan
+    if aproximado is None:
+        inicio = time.time()
+        aproximado = ApproximateOneClassSVM(gamma=gamma, nu=nu, **kwargs).fit(X)
+        tempo_aproximado = time.time() - inicio
+
+    rotulos_exato = exato.predict(X)
+    rotulos_aproximado = aproximado.predict(X)
+    anomalia_exato = rotulos_exato == -1
+    anomalia_aproximado = rotulos_aproximado == -1
+    verdadeiros = np.sum(anomalia_exato & anomalia_aproximado)
+
+    return pd.Series({
+        'linhas': len(X),
+        'tempo_exato_s': tempo_exato,
+        'tempo_aproximado_s': tempo_aproximado,
+        'anomalias_exato': anomalia_exato.mean(),
+        'anomalias_aproximado': anomalia_aproximado.mean(),
+        'concordancia': np.mean(rotulos_exato == rotulos_aproximado),
+        'precisao_anomalias': verdadeiros / anomalia_aproximado.sum() if anomalia_aproximado.any() else np.nan,
+        'recall_anomalias': verdadeiros / anomalia_exato.sum() if anomalia_exato.any() else np.nan,
+        'spearman_decisao': stats.spearmanr(exato.decision_function(X), aproximado.decision_function(X))[0],
+    })
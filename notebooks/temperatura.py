@@ -0,0 +1,161 @@
+import glob
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+# Arquivo compactado com os CSVs de temperatura média diária de cada cidade (gerados pela API da Weatherbit)
+TEMPERATURE_RAR_PATH = '../csvs_temperaturas.rar'
+TEMPERATURE_STORE_PATH = '../data_inteli/temperaturas.parquet'
+
+CSV_NAME_PATTERN = re.compile(r'daily_avg_temps_(?P<cidade>.+)\.csv$')
+
+
+class TemperatureStore:
+    """
+    Tabela local de temperaturas médias diárias, guardada como uma matriz float32 (cidade x dia).
+    A posição de cada valor é (city_code, day_ordinal): city_code é a posição da cidade em cidades e
+    day_ordinal é o número de dias desde inicio. Assim, a temperatura de milhões de linhas é obtida
+    por indexação direta na matriz, sem merge por cidade e data.
+    """
+
+    def __init__(self, cidades, inicio, valores):
+        self.cidades = pd.Index(cidades)
+        self.inicio = pd.Timestamp(inicio).normalize()
+        self.valores = np.asarray(valores, dtype=np.float32)
+
+    @classmethod
+    def from_frame(cls, df, cidade='cidade', data='data', temp='temp'):
+        """Monta a matriz a partir de uma tabela longa (cidade, data, temp); dias sem medição ficam NaN."""
+        datas = pd.to_datetime(df[data]).dt.normalize()
+        cidades = pd.Index(sorted(df[cidade].unique()))
+        inicio, fim = datas.min(), datas.max()
+
+        valores = np.full((len(cidades), (fim - inicio).days + 1), np.nan, dtype=np.float32)
+        valores[cidades.get_indexer(df[cidade]), (datas - inicio).dt.days.to_numpy()] = df[temp].to_numpy()
+        return cls(cidades, inicio, valores)
+
+    @property
+    def dias(self):
+        return pd.date_range(self.inicio, periods=self.valores.shape[1], freq='D')
+
+    def interpolate(self, limite=None):
+        """
+        Preenche os dias sem medição por interpolação linear entre os dias vizinhos da mesma cidade.
+        limite é o número máximo de dias consecutivos preenchidos; os extremos da série não são extrapolados.
+        """
+        matriz = pd.DataFrame(self.valores.T).interpolate(method='linear', limit=limite, limit_area='inside')
+        return TemperatureStore(self.cidades, self.inicio, matriz.to_numpy(dtype=np.float32).T)
+
+    def to_frame(self):
+        """Tabela longa (cidade, data, temp), no formato dos CSVs originais."""
+        return pd.DataFrame({
+            'cidade': pd.Categorical(np.repeat(self.cidades, self.valores.shape[1]), categories=self.cidades),
+            'data': np.tile(self.dias, len(self.cidades)),
+            'temp': self.valores.ravel(),
+        }).dropna(subset=['temp']).reset_index(drop=True)
+
+    def save(self, path=TEMPERATURE_STORE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.to_frame().to_parquet(path, index=False)
+        return path
+
+    @classmethod
+    def load(cls, path=TEMPERATURE_STORE_PATH):
+        return cls.from_frame(pd.read_parquet(path))
+
+    def lookup(self, cidades, datas):
+        """
+        Temperatura de cada linha a partir das colunas de cidade e data (ou data e hora).
+        Cidades desconhecidas e datas fora do período guardado retornam NaN.
+        """
+        if isinstance(getattr(cidades, 'dtype', None), pd.CategoricalDtype):
+            ## Converte apenas as categorias e depois indexa pelos códigos
+            mapa = np.append(self.cidades.get_indexer(cidades.cat.categories), -1)
+            codigos = mapa[cidades.cat.codes.to_numpy()]
+        else:
+            codigos = self.cidades.get_indexer(cidades)
+
+        dias = pd.DatetimeIndex(datas).to_numpy(dtype='datetime64[D]')
+        ordinais = (dias - np.datetime64(self.inicio.date(), 'D')).astype(np.int64)
+
+        validos = (codigos >= 0) & (ordinais >= 0) & (ordinais < self.valores.shape[1])
+        temperaturas = np.full(len(codigos), np.nan, dtype=np.float32)
+        temperaturas[validos] = self.valores[codigos[validos], ordinais[validos]]
+        return temperaturas
+
+
+def read_city_csvs(arquivos):
+    """
+    Lê os CSVs diários de temperatura (colunas date e temp) e retorna uma tabela longa (cidade, data, temp).
+    arquivos pode ser um dicionário {cidade: caminho} ou uma lista de caminhos daily_avg_temps_<cidade>.csv.
+    """
+    if not isinstance(arquivos, dict):
+        arquivos = {CSV_NAME_PATTERN.search(os.path.basename(path)).group('cidade'): path for path in arquivos}
+
+    tabelas = []
+    for cidade, path in arquivos.items():
+        df = pd.read_csv(path, parse_dates=['date']).rename(columns={'date': 'data'})
+        df['cidade'] = cidade
+        tabelas.append(df[['cidade', 'data', 'temp']])
+    return pd.concat(tabelas, ignore_index=True)
+
+
+def _extract_rar(path, destino):
+    """Extrai o .rar com a biblioteca rarfile, se instalada, ou com o unrar/bsdtar do sistema."""
+    try:
+        import rarfile
+    except ImportError:
+        rarfile = None
+
+    if rarfile is not None:
+        with rarfile.RarFile(path) as arquivo:
+            arquivo.extractall(destino)
+        return
+
+    if shutil.which('unrar'):
+        comando = ['unrar', 'x', '-o+', path, destino + os.sep]
+    elif shutil.which('bsdtar'):
+        comando = ['bsdtar', '-xf', path, '-C', destino]
+    else:
+        raise ImportError("Para ler o arquivo .rar instale o pacote rarfile ou os programas unrar ou bsdtar.")
+    subprocess.run(comando, check=True, capture_output=True)
+
+
+def read_rar(path=TEMPERATURE_RAR_PATH):
+    """Lê todos os CSVs daily_avg_temps_<cidade>.csv contidos no arquivo .rar."""
+    with tempfile.TemporaryDirectory() as destino:
+        _extract_rar(path, destino)
+        arquivos = [
+            p for p in glob.glob(os.path.join(destino, '**', '*.csv'), recursive=True)
+            if CSV_NAME_PATTERN.search(os.path.basename(p))
+        ]
+        return read_city_csvs(arquivos)
+
+
+def build_temperature_store(fonte=TEMPERATURE_RAR_PATH, path=TEMPERATURE_STORE_PATH, limite_interpolacao=None):
+    """
+    Importa as temperaturas (arquivo .rar, dicionário ou lista de CSVs), interpola os dias faltantes
+    e salva a tabela compacta em Parquet. Retorna o TemperatureStore.
+    """
+    if isinstance(fonte, str) and fonte.endswith('.rar'):
+        df = read_rar(fonte)
+    else:
+        df = read_city_csvs(fonte)
+
+    store = TemperatureStore.from_frame(df).interpolate(limite_interpolacao)
+    if path is not None:
+        store.save(path)
+    return store
+
+
+def load_temperature_store(path=TEMPERATURE_STORE_PATH, fonte=TEMPERATURE_RAR_PATH):
+    """Carrega a tabela de temperaturas salva, importando-a da fonte na primeira vez."""
+    if os.path.exists(path):
+        return TemperatureStore.load(path)
+    return build_temperature_store(fonte, path)